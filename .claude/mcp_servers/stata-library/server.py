@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+MCP server exposing the Stata-Tools library: command catalog, code
+snippets, pitfall database, and ado-code validation.
+
+Run standalone over stdio:
+
+    python server.py
+"""
+
+import asyncio
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+
+from mcp.server import Server
+from mcp.server.stdio import stdio_server
+from mcp.types import (
+    GetPromptResult,
+    Prompt,
+    PromptArgument,
+    PromptMessage,
+    Resource,
+    TextContent,
+    Tool,
+)
+
+SERVER_DIR = Path(__file__).parent
+TOOLS_DIR = SERVER_DIR / "tools"
+REPO_ROOT = SERVER_DIR.parent.parent.parent
+
+# The library modules scan the repository and build search indices
+# when loaded, which is too expensive to pay at server import (every
+# spawn of the server would block on it before the stdio handshake).
+# They are imported lazily on first use; main() warms them in the
+# background so the first tool call usually finds them ready.
+_T = None
+
+
+def _tools():
+    global _T
+    if _T is None:
+        sys.path.insert(0, str(TOOLS_DIR))
+        import commands
+        import pitfalls
+        import snippets
+        import validate
+
+        for mod in (commands, pitfalls, snippets):
+            mod.prewarm()
+        _T = SimpleNamespace(
+            commands=commands,
+            pitfalls=pitfalls,
+            snippets=snippets,
+            validate=validate,
+        )
+    return _T
+
+
+app = Server("stata-library")
+
+# orjson serializes catalog-shaped payloads several times faster than
+# stdlib json; fall back transparently when it is not installed.
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+
+except ImportError:
+
+    def _dumps(obj):
+        return json.dumps(obj, indent=2)
+
+
+# The catalogs are static for the lifetime of the server process, so the
+# read-only endpoints cache the final serialized JSON keyed by
+# (endpoint, filter) instead of re-walking the library and re-encoding
+# with json.dumps(indent=2) on every request.  Dynamic endpoints
+# (searches, validation) stay uncached.  Filter values come from the
+# client, so the cache is bounded: past the cap the oldest entry is
+# evicted (insertion order), which keeps a client iterating made-up
+# package/category names from growing server memory without limit.
+_RESPONSE_CACHE = {}
+_RESPONSE_CACHE_MAX = 128
+
+
+def _cached_json(key, build):
+    s = _RESPONSE_CACHE.get(key)
+    if s is None:
+        s = _dumps(build())
+        if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+            del _RESPONSE_CACHE[next(iter(_RESPONSE_CACHE))]
+        _RESPONSE_CACHE[key] = s
+    return s
+
+
+def _cached_text(key, build):
+    return [TextContent(type="text", text=_cached_json(key, build))]
+
+
+@lru_cache(maxsize=1)
+def _pattern_summary_text():
+    return "\n".join(
+        f"- {p['id']} ({p['severity']}): {p['title']}" for p in _tools().validate.list_patterns()
+    )
+
+
+# The tool/resource/prompt metadata is constant; build the objects
+# once instead of reconstructing them on every client poll.
+_TOOLS = [
+    Tool(
+        name="stata_lib",
+        description=(
+            "Look up Stata-Tools commands and snippets. Pass 'command' "
+            "for one command, 'snippet' for one snippet, 'query' to "
+            "search everything, or nothing to list all commands."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "command": {"type": "string"},
+                "snippet": {"type": "string"},
+                "query": {"type": "string"},
+                "package": {"type": "string"},
+                "limit": {"type": "integer"},
+            },
+        },
+    ),
+    Tool(
+        name="validate",
+        description=(
+            "Validate Stata ado/do code. Pass 'code' for inline "
+            "validation, 'file' to validate a file on disk, "
+            "'check_version' for the validator version, or nothing "
+            "to list the known patterns."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "code": {"type": "string"},
+                "file": {"type": "string"},
+                "check_version": {"type": "boolean"},
+            },
+        },
+    ),
+    Tool(
+        name="extended_tool",
+        description=(
+            "Extended library access: list_pitfalls, pitfall, "
+            "list_patterns, pattern, list_snippets, snippet."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "action": {"type": "string"},
+                "id": {"type": "string"},
+                "category": {"type": "string"},
+            },
+            "required": ["action"],
+        },
+    ),
+]
+
+
+@app.list_tools()
+async def handle_list_tools():
+    return _TOOLS
+
+
+_RESOURCES = [
+    Resource(
+        uri="stata://commands",
+        name="Stata-Tools command catalog",
+        description="Every command across all packages with purpose",
+        mimeType="application/json",
+    ),
+    Resource(
+        uri="stata://snippets",
+        name="Stata code snippets",
+        description="Reusable Stata code patterns in house style",
+        mimeType="application/json",
+    ),
+    Resource(
+        uri="stata://pitfalls",
+        name="Stata pitfall catalog",
+        description="Known Stata pitfalls with wrong/right examples",
+        mimeType="application/json",
+    ),
+]
+
+
+@app.list_resources()
+async def handle_list_resources():
+    return _RESOURCES
+
+
+@app.read_resource()
+async def handle_read_resource(uri):
+    uri = str(uri)
+    if uri == "stata://commands":
+        return _cached_json(("resource", uri), lambda: _tools().commands.list_commands())
+    if uri == "stata://snippets":
+        return _cached_json(("resource", uri), lambda: _tools().snippets.list_snippets())
+    if uri == "stata://pitfalls":
+        return _cached_json(("resource", uri), lambda: _tools().pitfalls.list_pitfalls())
+    raise ValueError(f"Unknown resource: {uri}")
+
+
+_PROMPTS = [
+    Prompt(
+        name="validate_ado",
+        description="Review Stata ado code against the pattern catalog",
+        arguments=[
+            PromptArgument(
+                name="code",
+                description="The ado/do code to review",
+                required=True,
+            )
+        ],
+    )
+]
+
+
+@app.list_prompts()
+async def handle_list_prompts():
+    return _PROMPTS
+
+
+def _prompt_validate_ado(code):
+    pattern_text = _pattern_summary_text()
+    return (
+        "Review the following Stata code against these known patterns:\n"
+        f"{pattern_text}\n\nCode:\n```stata\n{code}\n```"
+    )
+
+
+@app.get_prompt()
+async def handle_get_prompt(name, arguments):
+    if name != "validate_ado":
+        raise ValueError(f"Unknown prompt: {name}")
+    code = (arguments or {}).get("code", "")
+    return GetPromptResult(
+        description="Stata code review",
+        messages=[
+            PromptMessage(
+                role="user",
+                content=TextContent(type="text", text=_prompt_validate_ado(code)),
+            )
+        ],
+    )
+
+
+# Handlers that are pure CPU (dict lookups + serialization) are plain
+# functions; only the ones that actually await something (the fan-out
+# query, subprocess validation) are coroutines, so the sync paths skip
+# the per-call coroutine allocation.
+def _do_command(command, args):
+    result = _tools().commands.get_command(command)
+    if result is None:
+        result = {"error": f"Unknown command: {command}"}
+    return [TextContent(type="text", text=_dumps(result))]
+
+
+def _do_snippet(snippet, args):
+    result = _tools().snippets.get_snippet(snippet)
+    if result is None:
+        result = {"error": f"Unknown snippet: {snippet}"}
+    return [TextContent(type="text", text=_dumps(result))]
+
+
+async def _do_query(query, args):
+    # The three backends are independent; run them off the event loop
+    # so concurrent tool calls are not serialized behind a cold-cache
+    # search.
+    limit = args.get("limit", 5)
+    t = _tools()
+    cmd_results, snip_results, pitfall_results = await asyncio.gather(
+        asyncio.to_thread(t.commands.search_commands, query, limit=limit),
+        asyncio.to_thread(t.snippets.search_snippets, query, limit=limit),
+        asyncio.to_thread(t.pitfalls.search_pitfalls, query, limit=limit),
+    )
+    result = {
+        "commands": cmd_results,
+        "snippets": snip_results,
+        "pitfalls": pitfall_results,
+    }
+    return [TextContent(type="text", text=_dumps(result))]
+
+
+_STATA_LIB_DISPATCH = (
+    ("command", _do_command, False),
+    ("snippet", _do_snippet, False),
+    ("query", _do_query, True),
+)
+
+
+async def _handle_stata_lib(args):
+    for key, fn, is_async in _STATA_LIB_DISPATCH:
+        value = args.get(key)
+        if value:
+            result = fn(value, args)
+            return await result if is_async else result
+    package = args.get("package")
+    return _cached_text(
+        ("list_commands", package),
+        lambda: _tools().commands.list_commands(package=package),
+    )
+
+
+async def _handle_validate(args):
+    code = args.get("code")
+    file_path = args.get("file")
+    check_version = args.get("check_version")
+    validator = TOOLS_DIR / "validate.py"
+
+    if code:
+        result = _tools().validate.validate_ado_code(code)
+        return [TextContent(type="text", text=_dumps(result))]
+
+    if file_path:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable,
+                str(validator),
+                file_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(REPO_ROOT),
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    proc.communicate(), timeout=30
+                )
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                result = {"error": "Validation timed out after 30 seconds"}
+                return [
+                    TextContent(type="text", text=_dumps(result))
+                ]
+            text = stdout.decode() or stderr.decode()
+            return [TextContent(type="text", text=text)]
+        except OSError as exc:
+            result = {"error": str(exc)}
+            return [TextContent(type="text", text=_dumps(result))]
+
+    if check_version:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable,
+                str(validator),
+                "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(REPO_ROOT),
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    proc.communicate(), timeout=30
+                )
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                result = {"error": "Version check timed out after 30 seconds"}
+                return [
+                    TextContent(type="text", text=_dumps(result))
+                ]
+            result = {"validator_version": stdout.decode().strip()}
+            return [TextContent(type="text", text=_dumps(result))]
+        except OSError as exc:
+            result = {"error": str(exc)}
+            return [TextContent(type="text", text=_dumps(result))]
+
+    return _cached_text(
+        ("list_patterns", None), lambda: _tools().validate.list_patterns()
+    )
+
+
+# Action dispatch tables for extended_tool: listing actions go through
+# the response cache, getter actions serialize per item.
+_EXTENDED_LIST_ACTIONS = {
+    "list_pitfalls": lambda category: _tools().pitfalls.list_pitfalls(category=category),
+    "list_patterns": lambda category: _tools().validate.list_patterns(category=category),
+    "list_snippets": lambda category: _tools().snippets.list_snippets(category=category),
+}
+
+_EXTENDED_GET_ACTIONS = {
+    "pitfall": lambda item_id: _tools().pitfalls.get_pitfall(item_id),
+    "pattern": lambda item_id: _tools().validate.get_pattern_info(item_id),
+    "snippet": lambda item_id: _tools().snippets.get_snippet(item_id),
+}
+
+
+def _handle_extended(args):
+    action = args.get("action")
+
+    lister = _EXTENDED_LIST_ACTIONS.get(action)
+    if lister is not None:
+        category = args.get("category")
+        return _cached_text((action, category), lambda: lister(category))
+
+    getter = _EXTENDED_GET_ACTIONS.get(action)
+    if getter is not None:
+        item_id = args.get("id") or ""
+        result = getter(item_id)
+        if result is None:
+            result = {"error": f"Unknown {action}: {item_id}"}
+    else:
+        result = {"error": f"Unknown action: {action}"}
+    return [TextContent(type="text", text=_dumps(result))]
+
+
+# Tool dispatch table: handler plus whether it must be awaited.
+_TOOL_HANDLERS = {
+    "stata_lib": (_handle_stata_lib, True),
+    "validate": (_handle_validate, True),
+    "extended_tool": (_handle_extended, False),
+}
+
+
+@app.call_tool()
+async def handle_call_tool(name, arguments):
+    args = arguments or {}
+    entry = _TOOL_HANDLERS.get(name)
+    if entry is None:
+        result = {"error": f"Unknown tool: {name}"}
+        return [TextContent(type="text", text=_dumps(result))]
+    handler, is_async = entry
+    result = handler(args)
+    return await result if is_async else result
+
+
+async def main():
+    # Warm the library in the background while the stdio handshake runs.
+    warmup = asyncio.create_task(asyncio.to_thread(_tools))
+    async with stdio_server() as (read_stream, write_stream):
+        await app.run(
+            read_stream, write_stream, app.create_initialization_options()
+        )
+    await warmup
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""Shared test setup: put the server and its tools on sys.path once."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+SERVER_DIR = Path(__file__).parent.parent
+
+for p in (str(SERVER_DIR), str(SERVER_DIR / "tools")):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+
+@pytest.fixture(scope="session")
+def server_mod():
+    """The server module, imported once for the whole session."""
+    import server
+
+    return server
@@ -0,0 +1,92 @@
+"""Tests for tools/commands.py."""
+
+import json
+import os
+import time
+
+import commands
+from commands import get_command, list_commands, search_commands
+
+
+def test_get_command():
+    c = get_command("tvexpose")
+    assert c is not None
+    assert c["package"] == "tvtools"
+    assert {"name", "package", "purpose", "syntax", "options", "results", "file"} <= set(c)
+
+
+def test_get_command_case_insensitive():
+    assert get_command("TVEXPOSE") is not None
+
+
+def test_get_command_missing():
+    assert get_command("no_such_command") is None
+
+
+def test_list_commands():
+    results = list_commands()
+    assert len(results) >= 50
+    assert all({"name", "package", "purpose"} == set(r) for r in results)
+
+
+def test_list_commands_package():
+    results = list_commands(package="tvtools")
+    assert results
+    assert all(r["package"] == "tvtools" for r in results)
+
+
+def test_purposes_have_no_smcl_artifacts():
+    # The extraction regexes must consume the whole }}-run of the
+    # {p2col:{cmd:name} {hline 2}} header; a leading brace here means
+    # they regressed.
+    assert not [
+        r["name"] for r in list_commands() if r["purpose"].startswith("}")
+    ]
+
+
+def test_search_commands():
+    results = search_commands("merge")
+    assert results
+    assert any(r["name"] == "tvmerge" for r in results)
+
+
+def test_search_commands_limit():
+    assert len(search_commands("tv", limit=3)) <= 3
+
+
+def test_search_commands_no_match():
+    assert search_commands("zzzznotfound") == []
+
+
+def test_search_commands_short_query():
+    # Sub-trigram queries must still be containment-checked and ranked
+    # by field: name matches come before incidental substring hits.
+    assert search_commands("xq") == []
+    results = search_commands("tv", limit=5)
+    assert results
+    assert all(r["name"].startswith("tv") for r in results)
+
+
+def test_reload_after_regenerate(tmp_path, monkeypatch):
+    """All endpoints must serve the new snapshot after the index file
+    changes on disk, not just the ones that re-read it."""
+    data = json.loads(commands.INDEX_FILE.read_bytes())
+    index_file = tmp_path / "commands.json"
+    index_file.write_text(json.dumps(data))
+    monkeypatch.setattr(commands, "INDEX_FILE", index_file)
+
+    full = list_commands()
+    assert len(full) == len(data)
+    assert get_command(data[-1]["name"]) is not None
+
+    # Simulate `commands.py regenerate` shrinking the catalog.
+    kept = [c for c in data if c["name"] == "tvexpose"]
+    index_file.write_text(json.dumps(kept))
+    os.utime(index_file, ns=(time.time_ns(), time.time_ns()))
+
+    assert [r["name"] for r in list_commands()] == ["tvexpose"]
+    assert get_command("tvexpose") is not None
+    dropped = next(c["name"] for c in data if c["name"] != "tvexpose")
+    assert get_command(dropped) is None
+    hits = search_commands("tvexpose")
+    assert {r["name"] for r in hits} == {"tvexpose"}
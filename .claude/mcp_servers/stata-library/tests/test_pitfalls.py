@@ -0,0 +1,44 @@
+"""Tests for tools/pitfalls.py."""
+
+from pitfalls import get_pitfall, list_pitfalls, search_pitfalls
+
+
+def test_get_pitfall():
+    p = get_pitfall("macro_name_truncation")
+    assert p is not None
+    assert p["category"] == "limits"
+    assert "example_wrong" in p and "example_right" in p
+
+
+def test_get_pitfall_case_insensitive():
+    assert get_pitfall("MACRO_NAME_TRUNCATION") is not None
+
+
+def test_get_pitfall_missing():
+    assert get_pitfall("no_such_pitfall") is None
+
+
+def test_search_pitfalls():
+    results = search_pitfalls("macro")
+    assert results
+    assert any(r["id"] == "macro_name_truncation" for r in results)
+
+
+def test_search_pitfalls_limit():
+    assert len(search_pitfalls("a", limit=2)) <= 2
+
+
+def test_search_pitfalls_no_match():
+    assert search_pitfalls("zzzznotfound") == []
+
+
+def test_list_pitfalls():
+    results = list_pitfalls()
+    assert len(results) >= 5
+    assert all({"id", "title", "category"} == set(r) for r in results)
+
+
+def test_list_pitfalls_category():
+    results = list_pitfalls(category="data_management")
+    assert results
+    assert all(r["category"] == "data_management" for r in results)
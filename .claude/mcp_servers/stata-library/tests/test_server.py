@@ -0,0 +1,128 @@
+"""Tests for the stata-library MCP server handlers."""
+
+import json
+
+import pytest
+
+# One event loop for the whole session instead of an asyncio.run()
+# bootstrap (loop + selector + executor) per test.
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _text(result):
+    return json.loads(result[0].text)
+
+
+async def test_list_tools(server_mod):
+    tools = await server_mod.handle_list_tools()
+    assert {t.name for t in tools} == {"stata_lib", "validate", "extended_tool"}
+
+
+async def test_list_resources(server_mod):
+    resources = await server_mod.handle_list_resources()
+    assert {str(r.uri) for r in resources} == {
+        "stata://commands",
+        "stata://snippets",
+        "stata://pitfalls",
+    }
+
+
+async def test_list_prompts(server_mod):
+    prompts = await server_mod.handle_list_prompts()
+    assert [p.name for p in prompts] == ["validate_ado"]
+
+
+async def test_stata_lib_snippet(server_mod):
+    result = await server_mod.handle_call_tool(
+        "stata_lib", {"snippet": "safe_merge"}
+    )
+    payload = _text(result)
+    assert payload["name"] == "safe_merge"
+
+
+async def test_stata_lib_query(server_mod):
+    result = await server_mod.handle_call_tool("stata_lib", {"query": "merge"})
+    payload = _text(result)
+    assert set(payload) == {"commands", "snippets", "pitfalls"}
+    assert payload["snippets"]
+
+
+async def test_stata_lib_default_lists_commands(server_mod):
+    result = await server_mod.handle_call_tool("stata_lib", {})
+    payload = _text(result)
+    assert isinstance(payload, list)
+
+
+async def test_validate_code(server_mod):
+    result = await server_mod.handle_call_tool(
+        "validate", {"code": "program define t\n    display 1\nend\n"}
+    )
+    payload = _text(result)
+    assert payload["valid"] is False
+
+
+async def test_validate_no_args_lists_patterns(server_mod):
+    result = await server_mod.handle_call_tool("validate", {})
+    payload = _text(result)
+    assert any(p["id"] == "missing_version" for p in payload)
+
+
+async def test_validate_check_version(server_mod):
+    result = await server_mod.handle_call_tool(
+        "validate", {"check_version": True}
+    )
+    payload = _text(result)
+    assert "validator_version" in payload
+
+
+async def test_extended_list_pitfalls(server_mod):
+    result = await server_mod.handle_call_tool(
+        "extended_tool", {"action": "list_pitfalls"}
+    )
+    payload = _text(result)
+    assert any(p["id"] == "macro_name_truncation" for p in payload)
+
+
+async def test_extended_pitfall(server_mod):
+    result = await server_mod.handle_call_tool(
+        "extended_tool", {"action": "pitfall", "id": "macro_name_truncation"}
+    )
+    payload = _text(result)
+    assert payload["category"] == "limits"
+
+
+async def test_extended_pattern(server_mod):
+    result = await server_mod.handle_call_tool(
+        "extended_tool", {"action": "pattern", "id": "missing_version"}
+    )
+    payload = _text(result)
+    assert payload["severity"] == "error"
+
+
+async def test_extended_unknown_action(server_mod):
+    result = await server_mod.handle_call_tool("extended_tool", {"action": "bogus"})
+    payload = _text(result)
+    assert "error" in payload
+
+
+async def test_unknown_tool(server_mod):
+    result = await server_mod.handle_call_tool("nope", {})
+    payload = _text(result)
+    assert "error" in payload
+
+
+async def test_read_resource_snippets(server_mod):
+    payload = json.loads(await server_mod.handle_read_resource("stata://snippets"))
+    assert any(s["name"] == "safe_merge" for s in payload)
+
+
+async def test_read_resource_pitfalls(server_mod):
+    payload = json.loads(await server_mod.handle_read_resource("stata://pitfalls"))
+    assert any(p["id"] == "macro_name_truncation" for p in payload)
+
+
+async def test_get_prompt(server_mod):
+    result = await server_mod.handle_get_prompt(
+        "validate_ado", {"code": "display 1"}
+    )
+    assert "missing_version" in result.messages[0].content.text
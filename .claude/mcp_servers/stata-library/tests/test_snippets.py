@@ -0,0 +1,40 @@
+"""Tests for tools/snippets.py."""
+
+from snippets import get_snippet, list_snippets, search_snippets
+
+
+def test_get_snippet():
+    s = get_snippet("safe_merge")
+    assert s is not None
+    assert "nogenerate" in s["code"]
+
+
+def test_get_snippet_case_insensitive():
+    assert get_snippet("SAFE_MERGE") is not None
+
+
+def test_get_snippet_missing():
+    assert get_snippet("no_such_snippet") is None
+
+
+def test_search_snippets():
+    results = search_snippets("merge")
+    assert results
+    assert results[0]["name"] == "safe_merge"
+
+
+def test_search_snippets_limit():
+    assert len(search_snippets("e", limit=2)) <= 2
+
+
+def test_list_snippets():
+    results = list_snippets()
+    assert len(results) >= 5
+    assert all({"name", "purpose", "keywords"} == set(r) for r in results)
+
+
+def test_list_snippets_filtered():
+    results = list_snippets(category="loop")
+    assert results
+    for r in results:
+        assert "loop" in [k.lower() for k in r["keywords"]]
@@ -0,0 +1,204 @@
+"""Tests for tools/validate.py pattern detection."""
+
+from validate import (
+    detect_patterns,
+    detect_patterns_batch,
+    get_pattern_info,
+    list_patterns,
+    validate_ado_code,
+)
+
+
+def _ids(issues):
+    return [i["pattern"] for i in issues]
+
+
+def test_empty_code():
+    assert detect_patterns("") == []
+
+
+def test_missing_version():
+    code = "program define mytest\n    display 1\nend\n"
+    assert "missing_version" in _ids(detect_patterns(code))
+
+
+def test_has_version():
+    code = (
+        "program define mytest\n"
+        "    version 16.0\n"
+        "    set varabbrev off\n"
+        "    display 1\n"
+        "end\n"
+    )
+    assert "missing_version" not in _ids(detect_patterns(code))
+
+
+def test_missing_varabbrev():
+    code = "program define mytest\n    version 16.0\n    display 1\nend\n"
+    assert "missing_varabbrev" in _ids(detect_patterns(code))
+
+
+def test_marksample_hint():
+    code = (
+        "program define mytest\n"
+        "    version 16.0\n"
+        "    set varabbrev off\n"
+        "    syntax varlist [if] [in]\n"
+        "    summarize `varlist'\n"
+        "end\n"
+    )
+    assert "missing_marksample" in _ids(detect_patterns(code))
+
+
+def test_marksample_present():
+    code = (
+        "program define mytest\n"
+        "    version 16.0\n"
+        "    set varabbrev off\n"
+        "    syntax varlist [if] [in]\n"
+        "    marksample touse\n"
+        "end\n"
+    )
+    assert "missing_marksample" not in _ids(detect_patterns(code))
+
+
+def test_float_precision():
+    issues = detect_patterns("count if dose == 0.1\n")
+    assert "float_precision" in _ids(issues)
+    assert issues[0]["line"] == 1
+
+
+def test_bysort_function():
+    assert "bysort_calculation" in _ids(
+        detect_patterns("bysort id: keep if _n == 1\n")
+    )
+
+
+def test_bysort_unique_sort_still_flagged_with_n():
+    # The check is purely syntactic: any _n/_N under by is reported.
+    assert "bysort_calculation" in _ids(
+        detect_patterns("bysort id (entry): gen byte first = _n == 1\n")
+    )
+
+
+def test_long_macro_name():
+    code = "local cumulative_exposure_duration_in_days_x = 1\n"
+    assert "long_macro_name" in _ids(detect_patterns(code))
+
+
+def test_macro_name_ok():
+    assert "long_macro_name" not in _ids(detect_patterns("local cumdur = 1\n"))
+
+
+def test_nogen_merge():
+    code = 'merge m:1 id using "lookup.dta"\n'
+    assert "nogen_merge" in _ids(detect_patterns(code))
+
+
+def test_merge_with_nogen():
+    code = 'merge m:1 id using "lookup.dta", nogenerate\n'
+    assert "nogen_merge" not in _ids(detect_patterns(code))
+
+
+def test_merge_checked_merge_var():
+    code = 'merge m:1 id using "lookup.dta"\nassert _merge != 2\ndrop _merge\n'
+    assert "nogen_merge" not in _ids(detect_patterns(code))
+
+
+def test_capture_without_rc():
+    assert "capture_no_rc" in _ids(detect_patterns("capture drop score\n"))
+
+
+def test_capture_with_rc():
+    code = "capture confirm variable score\nif _rc == 0 drop score\n"
+    assert "capture_no_rc" not in _ids(detect_patterns(code))
+
+
+def test_capture_noisily_ok():
+    assert "capture_no_rc" not in _ids(
+        detect_patterns("capture noisily summarize score\n")
+    )
+
+
+def test_global_in_program():
+    code = (
+        "program define mytest\n"
+        "    version 16.0\n"
+        "    set varabbrev off\n"
+        "    global cutoff = 65\n"
+        "end\n"
+    )
+    issues = detect_patterns(code)
+    assert "global_in_program" in _ids(issues)
+
+
+def test_hardcoded_path():
+    assert "hardcoded_path" in _ids(
+        detect_patterns('use "/Users/jane/project/cohort.dta"\n')
+    )
+
+
+def test_issues_sorted_by_line():
+    code = "capture drop score\n\nlocal this_is_a_really_long_macro_name_x = 1\n"
+    issues = detect_patterns(code)
+    lines = [i["line"] for i in issues]
+    assert lines == sorted(lines)
+
+
+def test_validate_ado_code_counts():
+    code = "program define mytest\n    display 1\nend\n"
+    result = validate_ado_code(code)
+    assert result["valid"] is False
+    assert result["n_errors"] >= 1
+    assert result["n_errors"] == len(
+        [i for i in result["issues"] if i["severity"] == "error"]
+    )
+
+
+def test_validate_ado_code_clean():
+    code = (
+        "program define mytest\n"
+        "    version 16.0\n"
+        "    set varabbrev off\n"
+        "    display 1\n"
+        "end\n"
+    )
+    result = validate_ado_code(code)
+    assert result["valid"] is True
+    assert result["n_errors"] == 0
+
+
+def test_list_patterns():
+    patterns = list_patterns()
+    assert any(p["id"] == "missing_version" for p in patterns)
+    assert all({"id", "severity", "category", "title"} <= set(p) for p in patterns)
+
+
+def test_list_patterns_category():
+    patterns = list_patterns(category="program_structure")
+    assert patterns
+    assert all(p["category"] == "program_structure" for p in patterns)
+
+
+def test_get_pattern_info():
+    info = get_pattern_info("missing_version")
+    assert info is not None
+    assert info["severity"] == "error"
+    assert "description" in info
+
+
+def test_get_pattern_info_missing():
+    assert get_pattern_info("no_such_pattern") is None
+
+
+def test_detect_patterns_batch_matches_single():
+    codes = [
+        "if x == 0.1 {\n}\n",
+        "",
+        'use "/home/alice/data.dta"\nmerge 1:1 id using other\n',
+    ]
+    assert detect_patterns_batch(codes) == [detect_patterns(c) for c in codes]
+
+
+def test_detect_patterns_batch_empty():
+    assert detect_patterns_batch([]) == []
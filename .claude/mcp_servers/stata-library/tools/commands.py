@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+commands.py
+Command catalog for the Stata-Tools repository.
+
+Parses the .sthlp help files of every package into a JSON index
+(data/commands.json) and exposes lookup/search over it.  Regenerate the
+index after editing help files:
+
+    python commands.py regenerate
+"""
+
+import heapq
+import json
+import os
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+# orjson reads and writes the index noticeably faster than stdlib
+# json; fall back transparently when it is not installed.
+try:
+    from orjson import dumps as _dumps_bytes, loads as _loads
+except ImportError:
+    _dumps_bytes = None
+    _loads = json.loads
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+DATA_DIR = Path(__file__).parent.parent / "data"
+INDEX_FILE = DATA_DIR / "commands.json"
+
+# Repo prefix as a plain string: stripping it is cheaper than
+# Path.relative_to's part-by-part comparison on every indexed file.
+_REPO_PREFIX = REPO_ROOT.as_posix() + "/"
+
+
+# SMCL patterns, compiled once at import; the extractors run them over
+# every .sthlp file so per-call re-cache lookups add up.
+# The p2col purpose line usually reads {p2col:{cmd:name} {hline 2}}text,
+# so after the cmd tag there may be several closing braces before the
+# purpose text starts; \}+ consumes them all (a single \} used to leave
+# the second } of {hline 2}} at the front of the captured purpose).
+_SYNOPT = re.compile(r"\{synopt:\{opt(?:h)?\s+([^}]+)\}\}([^{]*)")
+_P2COL_ANY = re.compile(r"\{p2col:\{cmd:([^}]+)\}[^}]*\}+([^{]+)")
+_TITLE_ANY = re.compile(r"\{bf:([^}]+)\}[}\s]*\{hline[^}]*\}+\s*([^{]+)")
+# Last-resort title style with no {hline} rule: {bf:name} - purpose.
+_BF_DASH = re.compile(r"\{bf:([^}]+)\}\s+-\s+([^{]+)")
+_RESULT_SYNOPT = re.compile(r"\{synopt:\{cmd:r\(([^)]+)\)\}\}([^{]*)")
+
+
+_MARKER_RE = re.compile(r"\{marker\s+(\w+)\}", re.IGNORECASE)
+_TITLE_RE = re.compile(r"\{title:[^}]+\}")
+
+
+def _split_sections(content):
+    """Map section name -> raw SMCL body, in one scan of the file.
+
+    A section body runs from the end of the first {title:...} after its
+    {marker name} to the next marker (or end of file), mirroring the
+    old per-section regex without re-scanning the file per section.
+    """
+    markers = [
+        (m.start(), m.group(1).lower()) for m in _MARKER_RE.finditer(content)
+    ]
+    if not markers:
+        return {}
+    marker_starts = [pos for pos, _ in markers]
+    title_starts = []
+    title_ends = []
+    for m in _TITLE_RE.finditer(content):
+        title_starts.append(m.start())
+        title_ends.append(m.end())
+    sections = {}
+    for pos, name in markers:
+        t = bisect_left(title_starts, pos)
+        if t == len(title_starts):
+            continue
+        body_start = title_ends[t]
+        j = bisect_right(marker_starts, body_start)
+        body_end = marker_starts[j] if j < len(marker_starts) else len(content)
+        sections.setdefault(name, content[body_start:body_end])
+    return sections
+
+
+def _smcl_tag_prefix(token):
+    """Length of the leading [a-z_0-9]+ run of an SMCL tag name."""
+    n = 0
+    for ch in token:
+        if ch.islower() or ch.isdigit() or ch == "_":
+            n += 1
+        else:
+            break
+    return n
+
+
+def _strip_smcl_pass(text, keep_value):
+    """One left-to-right scan over the {...} tags in *text*.
+
+    With keep_value, `{tag:value}` keeps its value (the value is not
+    rescanned, matching a single re.sub pass); without it any `{tag...}`
+    is dropped whole.  Tokens that do not start with a tag name are
+    left in place, like the old regexes did.
+    """
+    out = []
+    i = 0
+    while True:
+        j = text.find("{", i)
+        if j == -1:
+            out.append(text[i:])
+            break
+        out.append(text[i:j])
+        k = text.find("}", j)
+        if k == -1:
+            out.append(text[j:])
+            break
+        token = text[j + 1 : k]
+        if token.startswith("..."):
+            pass  # {...} continuation, dropped
+        else:
+            n = _smcl_tag_prefix(token)
+            if n == 0:
+                out.append(text[j : k + 1])
+            elif keep_value and n < len(token) and token[n] == ":":
+                out.append(token[n + 1 :])
+            # any other tag is dropped whole
+        i = k + 1
+    return "".join(out)
+
+
+def clean_smcl(text):
+    """Strip SMCL markup from help-file text, leaving plain words.
+
+    Two linear find() scans replace the old chain of re.sub passes:
+    the first keeps tag values, the second drops tags the values
+    re-exposed (nested markup), then whitespace collapses in one
+    split/join.
+    """
+    if "{" in text:
+        text = _strip_smcl_pass(text, keep_value=True)
+        if "{" in text:
+            text = _strip_smcl_pass(text, keep_value=False)
+    return " ".join(text.split())
+
+
+def extract_section(content, section):
+    """Return the raw SMCL body of a {marker section} block."""
+    return _split_sections(content).get(section.lower(), "")
+
+
+def extract_options(content):
+    """Map option name -> description from the {synopt:...} table."""
+    options = {}
+    for m in _SYNOPT.finditer(content):
+        name = m.group(1).strip()
+        desc = clean_smcl(m.group(2))
+        if name and name not in options:
+            options[name] = desc
+    return options
+
+
+def _results_table(section):
+    results = {}
+    for m in _RESULT_SYNOPT.finditer(section):
+        results["r(%s)" % m.group(1)] = clean_smcl(m.group(2))
+    return results
+
+
+def extract_results(content):
+    """Map stored result r(...) -> description from the results section."""
+    return _results_table(extract_section(content, "results"))
+
+
+def extract_command_info(sthlp_path, pkg_name):
+    """Parse one .sthlp file into a command record, or None."""
+    try:
+        content = sthlp_path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    cmd_name = sthlp_path.stem
+
+    # Shared patterns capture any command name; matching it against
+    # cmd_name in Python avoids compiling re.escape'd patterns per
+    # file during index builds.  Subcommand help files write the name
+    # with a space ({p2col:{cmd:psdash balance}}) while the file stem
+    # joins it with an underscore, so both spellings are accepted.
+    # Known limitation: a help file whose title section never names
+    # the command next to its purpose (e.g. pkgtransfer, effecttab)
+    # is left with an empty purpose.
+    purpose = ""
+    accepted = (cmd_name, cmd_name.replace("_", " "))
+    for pattern in (_P2COL_ANY, _TITLE_ANY, _BF_DASH):
+        for m in pattern.finditer(content):
+            if m.group(1) in accepted:
+                purpose = clean_smcl(m.group(2))
+                break
+        if purpose:
+            break
+
+    sections = _split_sections(content)
+    syntax = clean_smcl(sections.get("syntax", ""))
+    if len(syntax) > 500:
+        syntax = syntax[:500] + "..."
+
+    return {
+        "name": cmd_name,
+        "package": pkg_name,
+        "purpose": purpose,
+        "syntax": syntax,
+        "options": extract_options(content),
+        "results": _results_table(sections.get("results", "")),
+        "file": sthlp_path.resolve().as_posix().removeprefix(_REPO_PREFIX),
+    }
+
+
+def _extract_worker(pair):
+    """Picklable wrapper around extract_command_info for the pool."""
+    sthlp_path, pkg_name = pair
+    return extract_command_info(Path(sthlp_path), pkg_name)
+
+
+# Below this many help files the pool startup costs more than the
+# parsing it parallelizes.
+_PARALLEL_THRESHOLD = 64
+
+# Non-package directories that would otherwise be scanned fruitlessly
+# for .sthlp files (dot/underscore prefixes are pruned separately).
+_SKIP_DIRS = frozenset(
+    {"node_modules", "docs", "tests", "build", "dist", "venv"}
+)
+
+
+def generate_command_index():
+    """Walk every package directory and rebuild commands.json."""
+    # os.scandir reuses the dirents for the is_dir checks and skips the
+    # per-entry Path construction that iterdir/glob would pay.
+    pairs = []
+    with os.scandir(REPO_ROOT) as it:
+        pkg_dirs = sorted(
+            (
+                (e.name, e.path)
+                for e in it
+                if e.is_dir()
+                and not e.name.startswith((".", "_"))
+                and e.name not in _SKIP_DIRS
+            ),
+        )
+    for pkg_name, pkg_path in pkg_dirs:
+        with os.scandir(pkg_path) as it:
+            pairs.extend(
+                (e.path, pkg_name)
+                for e in sorted(it, key=lambda e: e.name)
+                if e.name.endswith(".sthlp") and e.is_file()
+            )
+
+    # Parsing is independent per file and CPU-bound, so large corpora
+    # fan out across a process pool; ex.map preserves input order.
+    if len(pairs) >= _PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor() as ex:
+            parsed = list(ex.map(_extract_worker, pairs, chunksize=16))
+    else:
+        parsed = [_extract_worker(pair) for pair in pairs]
+    commands = [info for info in parsed if info]
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    # Compact JSON: the file is only ever read back by _load_commands,
+    # and indenting roughly doubles its size and parse time.
+    if _dumps_bytes is not None:
+        INDEX_FILE.write_bytes(_dumps_bytes(commands))
+    else:
+        with open(INDEX_FILE, "w", encoding="utf-8") as f:
+            json.dump(commands, f, separators=(",", ":"))
+    return len(commands)
+
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # optional dependency; substring scoring still works
+    fuzz = process = None
+
+
+# Parsed commands.json, cached in memory with an mtime check so the
+# lookup/search/list paths share one parse and pick up a regenerated
+# index without a restart.  Every derived structure (search state,
+# name index, getter cache) is keyed on the same (path, mtime) pair,
+# so a regeneration swaps the whole snapshot coherently instead of
+# leaving search and lookup serving the old catalog.
+def _index_key():
+    try:
+        return str(INDEX_FILE), INDEX_FILE.stat().st_mtime_ns
+    except OSError:
+        return str(INDEX_FILE), -1
+
+
+@lru_cache(maxsize=4)
+def _load_commands_cached(path_str, mtime_ns):
+    if mtime_ns < 0:
+        return []
+    commands = _loads(Path(path_str).read_bytes())
+    # Normalize the cache invariant here so list_commands can
+    # return slices without re-sorting per call.
+    commands.sort(key=lambda c: (c["package"], c["name"]))
+    return commands
+
+
+def _load_commands():
+    return _load_commands_cached(*_index_key())
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+# Trigram inverted index over the searchable text of every command
+# (name, purpose, package, option names).  Built lazily on the first
+# search; queries intersect posting lists instead of scanning the
+# whole catalog.  A whole-word token index sits in front of it so
+# single-keyword queries resolve to their posting list directly.
+# Keyed on the index snapshot so positions always index the catalog
+# they were built from.
+_TOKEN_RE = re.compile(r"\W+")
+
+
+@lru_cache(maxsize=4)
+def _search_state_cached(path_str, mtime_ns):
+    commands = _load_commands_cached(path_str, mtime_ns)
+    texts = []
+    index = {}
+    tokens = {}
+    lowered = []
+    for i, cmd in enumerate(commands):
+        name_lc = cmd["name"].lower()
+        purpose_lc = cmd["purpose"].lower()
+        package_lc = cmd["package"].lower()
+        options_lc = tuple(o.lower() for o in cmd["options"])
+        lowered.append((name_lc, purpose_lc, package_lc, options_lc))
+        text = " ".join(
+            [name_lc, purpose_lc, package_lc, " ".join(options_lc)]
+        )
+        texts.append(text)
+        for tri in _trigrams(text):
+            index.setdefault(tri, set()).add(i)
+        for tok in _TOKEN_RE.split(text):
+            if tok:
+                tokens.setdefault(tok, set()).add(i)
+    return (commands, texts, index, tokens, lowered)
+
+
+def _search_state():
+    return _search_state_cached(*_index_key())
+
+
+def _candidate_ids(query, texts, index):
+    """Doc ids verified to contain *query*, via trigram intersection.
+
+    Sub-trigram queries cannot use the index, but they still get the
+    containment check -- rankers downstream assume every candidate is
+    a real substring match.
+    """
+    if len(query) < 3:
+        return [i for i in range(len(texts)) if query in texts[i]]
+    postings = []
+    for tri in _trigrams(query):
+        posting = index.get(tri)
+        if posting is None:
+            return ()
+        postings.append(posting)
+    postings.sort(key=len)
+    candidates = set(postings[0]).intersection(*postings[1:])
+    return [i for i in candidates if query in texts[i]]
+
+
+def prewarm():
+    """Build the search index up front (called by the MCP server)."""
+    _search_state()
+
+
+# Records keyed by lowercased name, built lazily from the loaded
+# catalog so a case-insensitive lookup is one dict probe.
+@lru_cache(maxsize=4)
+def _name_index_cached(path_str, mtime_ns):
+    return {
+        c["name"].lower(): c
+        for c in _load_commands_cached(path_str, mtime_ns)
+    }
+
+
+@lru_cache(maxsize=256)
+def _get_command_cached(key_lower, path_str, mtime_ns):
+    return _name_index_cached(path_str, mtime_ns).get(key_lower)
+
+
+def get_command(name):
+    """Full record for a command, matched case-insensitively.
+
+    Cached; callers must treat the returned record as read-only.
+    """
+    return _get_command_cached(name.lower(), *_index_key())
+
+
+def search_commands(query, limit=10):
+    """Rank commands against *query* over name/purpose/package/options."""
+    commands, texts, index, tokens, lowered = _search_state()
+    q = query.lower()
+    token_ids = tokens.get(q)
+    # Sub-trigram queries match almost everything somewhere in the
+    # text ("tv" hits "intvars"), and WRatio cannot rank within such
+    # candidates; the field-weighted scorer below puts name matches
+    # first, so short queries always take that path.
+    if fuzz is not None and len(q) >= 3:
+        # Rank exact-substring candidates with rapidfuzz; if nothing
+        # contains the query verbatim, fall back to fuzzy matching over
+        # the whole corpus so near-miss queries still find results.
+        if token_ids is not None:
+            ids = list(token_ids)
+        else:
+            ids = list(_candidate_ids(q, texts, index))
+        if ids:
+            scored = [(fuzz.WRatio(q, texts[i]), i) for i in ids]
+        else:
+            hits = process.extract(
+                q, texts, scorer=fuzz.WRatio, limit=limit, score_cutoff=75
+            )
+            scored = [(score, idx) for _, score, idx in hits]
+        top = heapq.nlargest(limit, scored, key=lambda x: x[0])
+        return [{
+                "name": commands[i]["name"],
+                "package": commands[i]["package"],
+                "purpose": commands[i]["purpose"],
+            } for _, i in top]
+
+    matches = []
+    for i in (token_ids if token_ids is not None else _candidate_ids(q, texts, index)):
+        cmd = commands[i]
+        name_lc, purpose_lc, package_lc, options_lc = lowered[i]
+        score = 0
+        if q in name_lc:
+            score += 10
+        if q in purpose_lc:
+            score += 5
+        if q in package_lc:
+            score += 3
+        for opt in options_lc:
+            if q in opt:
+                score += 2
+        if score > 0:
+            matches.append(
+                (
+                    score,
+                    {
+                        "name": cmd["name"],
+                        "package": cmd["package"],
+                        "purpose": cmd["purpose"],
+                    },
+                )
+            )
+    return [m[1] for m in heapq.nlargest(limit, matches, key=lambda x: x[0])]
+
+
+def list_commands(package=None):
+    """Name/package/purpose of every command, optionally one package."""
+    results = []
+    for cmd in _load_commands():
+        if package and cmd["package"] != package:
+            continue
+        results.append(
+            {
+                "name": cmd["name"],
+                "package": cmd["package"],
+                "purpose": cmd["purpose"],
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "regenerate":
+        n = generate_command_index()
+        print(f"Indexed {n} commands -> {INDEX_FILE}")
+    else:
+        print(__doc__)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+pitfalls.py
+Catalog of Stata pitfalls (data/pitfalls.json) with lookup and search.
+
+Each pitfall documents a mistake we have actually seen in review, why
+it is wrong, and the corrected form.
+"""
+
+import heapq
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+
+# orjson parses the catalog noticeably faster than stdlib json; fall
+# back transparently when it is not installed.
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+PITFALLS_FILE = Path(__file__).parent.parent / "data" / "pitfalls.json"
+
+
+# Records are held as slotted frozen dataclasses rather than dicts:
+# far smaller per record and attribute access skips the hash lookup.
+# Dicts are materialized only at the API boundary (get_pitfall).
+@dataclass(frozen=True, slots=True)
+class Pitfall:
+    id: str
+    title: str
+    category: str
+    description: str
+    keywords: tuple
+    example_wrong: str
+    example_right: str
+
+
+# Keywords repeat heavily across records ("macro", "merge", ...);
+# intern each string and pool equal tuples so identical keyword sets
+# share one instance.
+_KEYWORD_POOL = {}
+
+
+def _keyword_tuple(keywords):
+    kws = tuple(sys.intern(k) for k in keywords)
+    return _KEYWORD_POOL.setdefault(kws, kws)
+
+
+# Every derived structure (search state, id index, category index,
+# getter cache) is keyed on this same (path, mtime) pair, so when the
+# file changes on disk the whole snapshot swaps coherently -- a stale
+# index is never used to position into a freshly reloaded list.
+def _catalog_key():
+    try:
+        return str(PITFALLS_FILE), PITFALLS_FILE.stat().st_mtime_ns
+    except OSError:
+        return str(PITFALLS_FILE), -1
+
+
+@lru_cache(maxsize=4)
+def _load_pitfalls_cached(path_str, mtime_ns):
+    if mtime_ns < 0:
+        return []
+    raw = _loads(Path(path_str).read_bytes())
+    return [
+        Pitfall(**{**p, "keywords": _keyword_tuple(p.get("keywords", ()))})
+        for p in raw
+    ]
+
+
+def _load_pitfalls():
+    """The parsed catalog, re-read when pitfalls.json changes on disk."""
+    return _load_pitfalls_cached(*_catalog_key())
+
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # optional dependency; substring scoring still works
+    fuzz = process = None
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+# Trigram inverted index over each pitfall's searchable text, built
+# lazily on first search so queries intersect posting lists instead of
+# scanning every record.  A whole-word token index sits in front of it
+# so single-keyword queries ("merge", "macro") resolve to their posting
+# list without any intersection work.  Keyed on the catalog snapshot
+# so positions always index the list they were built from.
+_TOKEN_RE = re.compile(r"\W+")
+
+
+@lru_cache(maxsize=4)
+def _search_state_cached(path_str, mtime_ns):
+    texts = []
+    index = {}
+    tokens = {}
+    lowered = []
+    for i, p in enumerate(_load_pitfalls_cached(path_str, mtime_ns)):
+        id_lc = p.id.lower()
+        title_lc = p.title.lower()
+        kw_lc = tuple(k.lower() for k in p.keywords)
+        desc_lc = p.description.lower()
+        lowered.append((id_lc, title_lc, kw_lc, desc_lc))
+        text = " ".join([id_lc, title_lc, " ".join(kw_lc), desc_lc])
+        texts.append(text)
+        for tri in _trigrams(text):
+            index.setdefault(tri, set()).add(i)
+        for tok in _TOKEN_RE.split(text):
+            if tok:
+                tokens.setdefault(tok, set()).add(i)
+    return (texts, index, tokens, lowered)
+
+
+def _search_state():
+    return _search_state_cached(*_catalog_key())
+
+
+def _candidate_ids(query, texts, index):
+    """Doc ids verified to contain *query*, via trigram intersection.
+
+    Sub-trigram queries cannot use the index, but they still get the
+    containment check -- rankers downstream assume every candidate is
+    a real substring match.
+    """
+    if len(query) < 3:
+        return [i for i in range(len(texts)) if query in texts[i]]
+    postings = []
+    for tri in _trigrams(query):
+        posting = index.get(tri)
+        if posting is None:
+            return ()
+        postings.append(posting)
+    postings.sort(key=len)
+    candidates = set(postings[0]).intersection(*postings[1:])
+    return [i for i in candidates if query in texts[i]]
+
+
+def prewarm():
+    """Build the search index up front (called by the MCP server)."""
+    _search_state()
+
+
+# Records keyed by lowercased id, so a case-insensitive lookup is one
+# dict probe instead of a scan.
+@lru_cache(maxsize=4)
+def _id_index_cached(path_str, mtime_ns):
+    return {
+        p.id.lower(): p for p in _load_pitfalls_cached(path_str, mtime_ns)
+    }
+
+
+@lru_cache(maxsize=256)
+def _get_pitfall_cached(key_lower, path_str, mtime_ns):
+    p = _id_index_cached(path_str, mtime_ns).get(key_lower)
+    return None if p is None else asdict(p)
+
+
+def get_pitfall(pitfall_id):
+    """Full record for one pitfall id (case-insensitive), or None.
+
+    Cached; callers must treat the returned record as read-only.
+    """
+    return _get_pitfall_cached(pitfall_id.lower(), *_catalog_key())
+
+
+def search_pitfalls(query, limit=5):
+    """Rank pitfalls against *query* over id/title/description/keywords."""
+    q = query.lower()
+    # One key for both lookups: the record list and the index built
+    # over it always come from the same snapshot of the file.
+    key = _catalog_key()
+    pitfalls = _load_pitfalls_cached(*key)
+    texts, index, tokens, lowered = _search_state_cached(*key)
+    token_ids = tokens.get(q)
+    # Sub-trigram queries match almost everything somewhere in the
+    # text, and WRatio cannot rank within such candidates; the
+    # field-weighted scorer below puts id/title matches first, so
+    # short queries always take that path.
+    if fuzz is not None and len(q) >= 3:
+        # Rank exact-substring candidates with rapidfuzz; if nothing
+        # contains the query verbatim, fall back to fuzzy matching over
+        # the whole corpus so near-miss queries still find results.
+        if token_ids is not None:
+            ids = list(token_ids)
+        else:
+            ids = list(_candidate_ids(q, texts, index))
+        if ids:
+            scored = [(fuzz.WRatio(q, texts[i]), i) for i in ids]
+        else:
+            hits = process.extract(
+                q, texts, scorer=fuzz.WRatio, limit=limit, score_cutoff=75
+            )
+            scored = [(score, idx) for _, score, idx in hits]
+        top = heapq.nlargest(limit, scored, key=lambda x: x[0])
+        return [{
+                "id": pitfalls[i].id,
+                "title": pitfalls[i].title,
+                "category": pitfalls[i].category,
+            } for _, i in top]
+
+    matches = []
+    for i in (token_ids if token_ids is not None else _candidate_ids(q, texts, index)):
+        p = pitfalls[i]
+        id_lc, title_lc, kw_lc, desc_lc = lowered[i]
+        score = 0
+        if q in id_lc:
+            score += 10
+        if q in title_lc:
+            score += 8
+        for kw in kw_lc:
+            if q in kw:
+                score += 5
+        if q in desc_lc:
+            score += 3
+        if score > 0:
+            matches.append(
+                (score, {"id": p.id, "title": p.title, "category": p.category})
+            )
+    return [m[1] for m in heapq.nlargest(limit, matches, key=lambda x: x[0])]
+
+
+# Summary projections grouped by category, built lazily alongside the
+# catalog so list_pitfalls is a dict lookup rather than a scan.
+@lru_cache(maxsize=4)
+def _category_index_cached(path_str, mtime_ns):
+    summaries = [
+        {"id": p.id, "title": p.title, "category": p.category}
+        for p in _load_pitfalls_cached(path_str, mtime_ns)
+    ]
+    by_category = {}
+    for s in summaries:
+        by_category.setdefault(s["category"], []).append(s)
+    return (summaries, by_category)
+
+
+def list_pitfalls(category=None):
+    """Id/title/category of every pitfall, optionally one category."""
+    summaries, by_category = _category_index_cached(*_catalog_key())
+    if category:
+        return list(by_category.get(category, ()))
+    return list(summaries)
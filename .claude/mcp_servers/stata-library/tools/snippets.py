@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+snippets.py
+Reusable Stata code patterns served by the stata-library MCP server.
+
+Each snippet is a small, self-contained piece of ado/do code showing
+the house style for a recurring task (safe merges, program skeletons,
+date handling, ...).
+"""
+
+import heapq
+import re
+import sys
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+
+# Records are held as slotted frozen dataclasses rather than dicts:
+# far smaller per record and attribute access skips the hash lookup.
+# Dicts are materialized only at the API boundary (get_snippet).
+@dataclass(frozen=True, slots=True)
+class Snippet:
+    name: str
+    purpose: str
+    keywords: tuple
+    code: str
+
+
+_RAW_SNIPPETS = {
+    "program_skeleton": {
+        "name": "program_skeleton",
+        "purpose": "Minimal rclass program with version, varabbrev, and syntax",
+        "keywords": ["program", "skeleton", "syntax", "rclass"],
+        "code": """\
+program define mytool, rclass
+    version 16.0
+    set varabbrev off
+    syntax varlist(min=1) [if] [in], ID(varname) [Verbose]
+    marksample touse
+    quietly count if `touse'
+    if r(N) == 0 {
+        error 2000
+    }
+    return scalar N = r(N)
+end
+""",
+    },
+    "safe_merge": {
+        "name": "safe_merge",
+        "purpose": "Merge with explicit match handling and no leftover _merge",
+        "keywords": ["merge", "data_management", "nogenerate"],
+        "code": """\
+merge m:1 id using "`lookup'", keep(master match) nogenerate
+""",
+    },
+    "foreach_varlist": {
+        "name": "foreach_varlist",
+        "purpose": "Loop over a varlist applying the same transformation",
+        "keywords": ["loop", "foreach", "varlist"],
+        "code": """\
+foreach v of varlist `varlist' {
+    quietly replace `v' = . if `v' < 0
+}
+""",
+    },
+    "forvalues_loop": {
+        "name": "forvalues_loop",
+        "purpose": "Numeric loop over indexed variables",
+        "keywords": ["loop", "forvalues"],
+        "code": """\
+forvalues i = 1/`n' {
+    local var : word `i' of `varlist'
+    display as text "`i': `var'"
+}
+""",
+    },
+    "tempfile_preserve": {
+        "name": "tempfile_preserve",
+        "purpose": "Save an intermediate dataset without touching the user's data",
+        "keywords": ["tempfile", "preserve", "data_management"],
+        "code": """\
+tempfile snapshot
+preserve
+keep id outcome
+save "`snapshot'"
+restore
+""",
+    },
+    "date_conversion": {
+        "name": "date_conversion",
+        "purpose": "Convert string dates to Stata daily dates with format",
+        "keywords": ["date", "conversion", "format"],
+        "code": """\
+generate entry_date = daily(entry_str, "YMD")
+format entry_date %td
+assert !missing(entry_date) if !missing(entry_str)
+""",
+    },
+    "error_handling": {
+        "name": "error_handling",
+        "purpose": "capture with explicit _rc check and informative error",
+        "keywords": ["capture", "error", "rc"],
+        "code": """\
+capture confirm variable `id'
+if _rc {
+    display as error "id variable `id' not found"
+    exit 111
+}
+""",
+    },
+    "bysort_first": {
+        "name": "bysort_first",
+        "purpose": "Tag the first observation per group with a unique sort",
+        "keywords": ["bysort", "loop", "groups"],
+        "code": """\
+bysort id (entry_date): generate byte first = _n == 1
+""",
+    },
+}
+
+# Keywords repeat heavily across records ("loop", "merge", ...);
+# intern each string and pool equal tuples so identical keyword sets
+# share one instance.
+_KEYWORD_POOL = {}
+
+
+def _keyword_tuple(keywords):
+    kws = tuple(sys.intern(k) for k in keywords)
+    return _KEYWORD_POOL.setdefault(kws, kws)
+
+
+SNIPPETS = {
+    key: Snippet(**{**raw, "keywords": _keyword_tuple(raw.get("keywords", ()))})
+    for key, raw in _RAW_SNIPPETS.items()
+}
+
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # optional dependency; substring scoring still works
+    fuzz = process = None
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+# Trigram inverted index over each snippet's searchable text, built
+# lazily on first search so queries intersect posting lists instead of
+# scanning every record.  A whole-word token index sits in front of it
+# so single-keyword queries ("merge", "loop") resolve to their posting
+# list without any intersection work.
+_SEARCH_STATE = None
+
+_TOKEN_RE = re.compile(r"\W+")
+
+
+def _search_state():
+    global _SEARCH_STATE
+    if _SEARCH_STATE is None:
+        names = []
+        texts = []
+        index = {}
+        tokens = {}
+        for i, snippet in enumerate(SNIPPETS.values()):
+            names.append(snippet.name)
+            text = " ".join(
+                [snippet.name, snippet.purpose, " ".join(snippet.keywords), snippet.code]
+            ).lower()
+            texts.append(text)
+            for tri in _trigrams(text):
+                index.setdefault(tri, set()).add(i)
+            for tok in _TOKEN_RE.split(text):
+                if tok:
+                    tokens.setdefault(tok, set()).add(i)
+        _SEARCH_STATE = (names, texts, index, tokens)
+    return _SEARCH_STATE
+
+
+def _candidate_ids(query, texts, index):
+    """Doc ids verified to contain *query*, via trigram intersection.
+
+    Sub-trigram queries cannot use the index, but they still get the
+    containment check -- rankers downstream assume every candidate is
+    a real substring match.
+    """
+    if len(query) < 3:
+        return [i for i in range(len(texts)) if query in texts[i]]
+    postings = []
+    for tri in _trigrams(query):
+        posting = index.get(tri)
+        if posting is None:
+            return ()
+        postings.append(posting)
+    postings.sort(key=len)
+    candidates = set(postings[0]).intersection(*postings[1:])
+    return [i for i in candidates if query in texts[i]]
+
+
+def prewarm():
+    """Build the search index up front (called by the MCP server)."""
+    _search_state()
+
+
+# Records keyed by lowercased name, so a case-insensitive lookup is
+# one dict probe instead of a scan.
+_BY_NAME = {key.lower(): snippet for key, snippet in SNIPPETS.items()}
+
+
+@lru_cache(maxsize=256)
+def _get_snippet_cached(key_lower):
+    snippet = _BY_NAME.get(key_lower)
+    return None if snippet is None else asdict(snippet)
+
+
+def get_snippet(name):
+    """Full snippet record matched case-insensitively, or None.
+
+    Cached; callers must treat the returned record as read-only.
+    """
+    return _get_snippet_cached(name.lower())
+
+
+def search_snippets(query, limit=5):
+    """Rank snippets against *query* over name/purpose/keywords/code."""
+    q = query.lower()
+    names, texts, index, tokens = _search_state()
+    token_ids = tokens.get(q)
+    # Sub-trigram queries match almost everything somewhere in the
+    # text, and WRatio cannot rank within such candidates; the
+    # field-weighted scorer below puts name matches first, so short
+    # queries always take that path.
+    if fuzz is not None and len(q) >= 3:
+        # Rank exact-substring candidates with rapidfuzz; if nothing
+        # contains the query verbatim, fall back to fuzzy matching over
+        # the whole corpus so near-miss queries still find results.
+        if token_ids is not None:
+            ids = list(token_ids)
+        else:
+            ids = list(_candidate_ids(q, texts, index))
+        if ids:
+            scored = [(fuzz.WRatio(q, texts[i]), i) for i in ids]
+        else:
+            hits = process.extract(
+                q, texts, scorer=fuzz.WRatio, limit=limit, score_cutoff=75
+            )
+            scored = [(score, idx) for _, score, idx in hits]
+        top = heapq.nlargest(limit, scored, key=lambda x: x[0])
+        return [{
+                "name": SNIPPETS[names[i]].name,
+                "purpose": SNIPPETS[names[i]].purpose,
+            } for _, i in top]
+
+    matches = []
+    for i in (token_ids if token_ids is not None else _candidate_ids(q, texts, index)):
+        snippet = SNIPPETS[names[i]]
+        score = 0
+        if q in snippet.name.lower():
+            score += 10
+        if q in snippet.purpose.lower():
+            score += 5
+        for kw in snippet.keywords:
+            if q in kw.lower():
+                score += 3
+        if q in snippet.code.lower():
+            score += 1
+        if score > 0:
+            matches.append(
+                (
+                    score,
+                    {"name": snippet.name, "purpose": snippet.purpose},
+                )
+            )
+    return [m[1] for m in heapq.nlargest(limit, matches, key=lambda x: x[0])]
+
+
+# Summary projections grouped by lowercased keyword, built once at
+# import so list_snippets is a dict lookup rather than a scan.
+_SNIPPET_SUMMARIES = [
+    {"name": s.name, "purpose": s.purpose, "keywords": list(s.keywords)}
+    for s in SNIPPETS.values()
+]
+_BY_KEYWORD = {}
+for _s in _SNIPPET_SUMMARIES:
+    for _kw in _s["keywords"]:
+        _BY_KEYWORD.setdefault(_kw.lower(), []).append(_s)
+del _s, _kw
+
+
+def list_snippets(category=None):
+    """Name/purpose of every snippet, optionally filtered by keyword."""
+    if category:
+        return list(_BY_KEYWORD.get(category.lower(), ()))
+    return list(_SNIPPET_SUMMARIES)
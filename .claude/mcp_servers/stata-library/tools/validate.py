@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""
+validate.py
+Static checks for Stata ado/do code.
+
+Detects common Stata pitfalls (missing version statement, macro names
+longer than 31 characters, merge without nogenerate, capture without
+_rc check, ...) and reports them as structured issues.  Used by the
+stata-library MCP server and runnable standalone:
+
+    python validate.py mycommand.ado
+    python validate.py --version
+"""
+
+import heapq
+import json
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from operator import attrgetter
+
+VALIDATOR_VERSION = "1.0.0"
+
+# Pattern records are slotted frozen dataclasses rather than dicts:
+# attribute access in the hot loops skips the per-key hash lookup and
+# the records are immutable by construction.
+@dataclass(frozen=True, slots=True)
+class Pattern:
+    id: str
+    severity: str
+    category: str
+    title: str
+    description: str
+    pattern: str | None
+
+
+# Pattern table.  Entries with a "pattern" regex are matched line by
+# line; entries with pattern None are implemented by a _check_* helper
+# that needs more context than a single line.
+_PATTERN_DEFS = [
+    {
+        "id": "float_precision",
+        "severity": "warning",
+        "category": "precision",
+        "title": "Comparison against a decimal literal",
+        "description": (
+            "Variables stored as float cannot represent most decimal "
+            "fractions exactly, so equality comparisons like x == 0.1 "
+            "silently fail.  Use float(0.1) or store as double."
+        ),
+        "pattern": r"==\s*\d+\.\d+",
+    },
+    {
+        "id": "hardcoded_path",
+        "severity": "warning",
+        "category": "portability",
+        "title": "Hard-coded absolute path",
+        "description": (
+            "Absolute paths break when the project moves between "
+            "machines.  Use relative paths or a global set in a "
+            "profile/master do-file."
+        ),
+        "pattern": r'"(?:[A-Za-z]:[\\/]|/Users/|/home/)',
+    },
+    {
+        "id": "missing_gt_comparison",
+        "severity": "warning",
+        "category": "missing_values",
+        "title": "Comparison that treats missing as large",
+        "description": (
+            "Stata missing values sort above any number, so conditions "
+            "like 'if age > 65' are true for missing.  Add "
+            "'& !missing(var)' to the condition."
+        ),
+        "pattern": r"\bif\s+\w+\s*>=?\s*[\d.]",
+    },
+    {
+        "id": "bysort_calculation",
+        "severity": "warning",
+        "category": "sort_order",
+        "title": "Order-dependent calculation under bysort",
+        "description": (
+            "Using _n or _N under bysort is order dependent; ties in "
+            "the sort key make results irreproducible unless the sort "
+            "is made unique."
+        ),
+        "pattern": r"\bby(?:sort)?\s+[^:]+:\s*(?:g(?:en(?:erate)?)?|egen|replace|keep|drop)\b.*\b_[nN]\b",
+    },
+    {
+        "id": "delimit_semicolon",
+        "severity": "info",
+        "category": "style",
+        "title": "#delimit ; in use",
+        "description": (
+            "Semicolon delimiting is error prone and rarely needed; "
+            "prefer /// line continuations."
+        ),
+        "pattern": r"^\s*#delimit\s*;",
+    },
+    {
+        "id": "missing_version",
+        "severity": "error",
+        "category": "program_structure",
+        "title": "Program without version statement",
+        "description": (
+            "Programs should declare a Stata version immediately after "
+            "program define so behavior is reproducible across releases."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "missing_varabbrev",
+        "severity": "warning",
+        "category": "program_structure",
+        "title": "Program without set varabbrev off",
+        "description": (
+            "Variable abbreviation inside shipped programs makes them "
+            "fragile against user datasets; set varabbrev off defensively."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "missing_marksample",
+        "severity": "info",
+        "category": "program_structure",
+        "title": "syntax accepts [if]/[in] but marksample not used",
+        "description": (
+            "A program whose syntax accepts [if] or [in] should call "
+            "marksample touse so the sample restriction is honored."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "global_in_program",
+        "severity": "warning",
+        "category": "scope",
+        "title": "Global macro defined inside program",
+        "description": (
+            "Globals defined inside a program leak into the caller's "
+            "session.  Prefer locals or return values."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "long_macro_name",
+        "severity": "error",
+        "category": "limits",
+        "title": "Macro name longer than 31 characters",
+        "description": (
+            "Stata silently truncates local macro names to 31 "
+            "characters, which makes distinct names collide."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "nogen_merge",
+        "severity": "warning",
+        "category": "data_management",
+        "title": "merge without nogenerate",
+        "description": (
+            "merge without nogenerate leaves a _merge variable behind "
+            "that breaks the next merge.  Use nogenerate or drop _merge "
+            "after checking it."
+        ),
+        "pattern": None,
+    },
+    {
+        "id": "capture_no_rc",
+        "severity": "warning",
+        "category": "error_handling",
+        "title": "capture without checking _rc",
+        "description": (
+            "capture swallows errors; if _rc is never inspected the "
+            "failure is silently ignored."
+        ),
+        "pattern": None,
+    },
+]
+
+PATTERNS = [Pattern(**d) for d in _PATTERN_DEFS]
+del _PATTERN_DEFS
+
+
+# All line patterns are fused into one alternation with named groups,
+# so detect_patterns makes a single pass over the source instead of one
+# scan per pattern; match.lastgroup maps back to the pattern id.  The
+# fused regex is also why the records carry no per-pattern compiled
+# regex: nothing matches patterns individually any more.
+_COMBINED = re.compile(
+    "|".join(f"(?P<{p.id}>{p.pattern})" for p in PATTERNS if p.pattern),
+    re.MULTILINE,
+)
+
+
+# Regexes used by the structural checks, compiled once at import so
+# the per-call cost is just the match, not a re-cache lookup.
+_RE_PROG_START = re.compile(
+    r"^[ \t]*program\s+(?:define\s+)?(\w+)", re.IGNORECASE | re.MULTILINE
+)
+_RE_PROG_END = re.compile(r"^[ \t]*end[ \t]*\r?$", re.IGNORECASE | re.MULTILINE)
+_RE_VERSION = re.compile(r"^\s*version\s+\d", re.MULTILINE)
+_RE_VARABBREV = re.compile(r"set\s+varabbrev\s+off", re.IGNORECASE)
+_RE_SYNTAX_IF = re.compile(r"syntax\b.*\[\s*if\s*\]", re.IGNORECASE)
+_RE_SYNTAX_IN = re.compile(r"syntax\b.*\[\s*in\s*\]", re.IGNORECASE)
+_RE_MARKSAMPLE = re.compile(r"\bmarksample\b", re.IGNORECASE)
+_RE_GLOBAL = re.compile(r"\s*global\s+\w+")
+_RE_MACRO_DEF = re.compile(r"^\s*(?:local|tempvar|tempname|tempfile)\s+(\w+)")
+_MACRO_KEYWORDS = (
+    "local ", "local\t",
+    "tempvar ", "tempvar\t",
+    "tempname ", "tempname\t",
+    "tempfile ", "tempfile\t",
+)
+_RE_MERGE = re.compile(r"\bmerge\b\s+[\d:m]+.*\busing\b", re.IGNORECASE)
+_RE_NOGEN = re.compile(r"\bnogen(?:erate)?\b", re.IGNORECASE)
+_RE_CAPTURE = re.compile(r"^\s*capture\s+(?!noisily\b)")
+
+
+def _newline_offsets(code):
+    """Offsets of every newline in *code*, for bisect line lookups."""
+    offsets = []
+    pos = code.find("\n")
+    while pos != -1:
+        offsets.append(pos)
+        pos = code.find("\n", pos + 1)
+    return offsets
+
+
+def _find_program_blocks(code):
+    """Locate program define ... end blocks in the source.
+
+    Two multiline scans find every program/end line; the sorted start
+    and end offsets are then paired up, and each block's code is sliced
+    straight out of the source instead of rejoining lines.
+    """
+    blocks = []
+    nl = _newline_offsets(code)
+    starts = [(m.start(), m.group(1)) for m in _RE_PROG_START.finditer(code)]
+    ends = [m.start() for m in _RE_PROG_END.finditer(code)]
+    last_end = -1
+    ei = 0
+    for off, name in starts:
+        if off <= last_end:
+            continue  # a program line nested inside the current block
+        while ei < len(ends) and ends[ei] < off:
+            ei += 1
+        if ei == len(ends):
+            break  # unterminated block, same as the line scanner
+        end_off = ends[ei]
+        ei += 1
+        last_end = end_off
+        start_line = bisect_left(nl, off)
+        end_line = bisect_left(nl, end_off)
+        line_start = 0 if start_line == 0 else nl[start_line - 1] + 1
+        line_end = nl[end_line] if end_line < len(nl) else len(code)
+        blocks.append(
+            {
+                "name": name,
+                "start": start_line,
+                "end": end_line,
+                "span": (line_start, line_end),
+                "code": code[line_start:line_end],
+            }
+        )
+    return blocks
+
+
+def _check_missing_block_features(code, blocks):
+    """Missing version/varabbrev/marksample checks for every block.
+
+    Instead of rescanning each block's code per keyword, each keyword
+    regex runs once over the whole source and its matches are bucketed
+    to the enclosing block by offset, so the per-block checks reduce
+    to flag lookups.
+    """
+    n = len(blocks)
+    block_starts = [b["span"][0] for b in blocks]
+
+    def flags(regex):
+        found = [False] * n
+        for m in regex.finditer(code):
+            i = bisect_right(block_starts, m.start()) - 1
+            if i >= 0 and m.start() < blocks[i]["span"][1]:
+                found[i] = True
+        return found
+
+    has_version = flags(_RE_VERSION)
+    has_varabbrev = flags(_RE_VARABBREV)
+    has_if = flags(_RE_SYNTAX_IF)
+    has_in = flags(_RE_SYNTAX_IN)
+    has_marksample = flags(_RE_MARKSAMPLE)
+
+    issues = []
+    for i, block in enumerate(blocks):
+        line = block["start"] + 1
+        if not has_version[i]:
+            issues.append(Issue("missing_version", line))
+        if not has_varabbrev[i]:
+            issues.append(Issue("missing_varabbrev", line))
+        if (has_if[i] or has_in[i]) and not has_marksample[i]:
+            issues.append(Issue("missing_marksample", line))
+    return issues
+
+
+def _check_global_in_program(code, blocks):
+    issues = []
+    for block in blocks:
+        offset = block["start"]
+        for j, bline in enumerate(block["code"].split("\n")):
+            if _RE_GLOBAL.match(bline):
+                issues.append(Issue("global_in_program", offset + j + 1))
+    return issues
+
+
+def _check_long_macro_name(lines):
+    issues = []
+    for i, line in enumerate(lines):
+        # A >31-char name after the shortest keyword ("local ") needs
+        # at least 38 characters, so short lines skip everything, and
+        # a C-level startswith probe rejects non-defining lines before
+        # the regex runs.
+        if len(line) < 38:
+            continue
+        s = line.lstrip()
+        if not s.startswith(_MACRO_KEYWORDS):
+            continue
+        m = _RE_MACRO_DEF.match(s)
+        if m and len(m.group(1)) > 31:
+            issues.append(Issue("long_macro_name", i + 1))
+    return issues
+
+
+def _check_nogen_merge(code, lines):
+    issues = []
+    uses_merge_var = "_merge" in code
+    for i, line in enumerate(lines):
+        if _RE_MERGE.search(line):
+            if not _RE_NOGEN.search(line):
+                if not uses_merge_var:
+                    issues.append(Issue("nogen_merge", i + 1))
+    return issues
+
+
+def _check_capture_no_rc(code, lines):
+    issues = []
+    checks_rc = "_rc" in code
+    for i, line in enumerate(lines):
+        if _RE_CAPTURE.match(line) and not checks_rc:
+            issues.append(Issue("capture_no_rc", i + 1))
+    return issues
+
+
+# The fixed per-pattern fields of an issue, keyed by pattern id, so
+# the checks only record (pattern id, line) and the full dicts are
+# materialized once at the API boundary.
+PATTERN_META = {
+    p.id: {
+        "pattern": p.id,
+        "severity": p.severity,
+        "category": p.category,
+        "message": p.title,
+    }
+    for p in PATTERNS
+}
+
+
+@dataclass(slots=True)
+class Issue:
+    pattern_id: str
+    line: int
+
+
+def _issue_dict(issue):
+    return {**PATTERN_META[issue.pattern_id], "line": issue.line}
+
+
+def _structural_issue_lists(code):
+    """The structural checks' results as separate line-sorted lists.
+
+    Each helper emits in line order already, so callers can heapq.merge
+    the lists instead of paying a full sort over the combined result.
+    """
+    lists = []
+    # The source is split once here and shared by every helper.
+    lines = code.split("\n")
+    # The block-based checks can only fire inside a program block; one
+    # substring probe skips four scans when linting a bare snippet.
+    if "program" in code:
+        blocks = _find_program_blocks(code)
+        lists.append(_check_missing_block_features(code, blocks))
+        lists.append(_check_global_in_program(code, blocks))
+    # The line-based checks get the same treatment: a substring probe
+    # is far cheaper than a regex scan that cannot match anyway.
+    if "local" in code or "temp" in code:
+        lists.append(_check_long_macro_name(lines))
+    if "merge" in code:
+        lists.append(_check_nogen_merge(code, lines))
+    if "capture" in code:
+        lists.append(_check_capture_no_rc(code, lines))
+    return lists
+
+
+def detect_patterns_batch(codes):
+    """detect_patterns over many sources with one fused-regex pass.
+
+    The sources are joined with a sentinel line that cannot match any
+    line pattern, the combined regex runs once over the whole buffer,
+    and matches are demultiplexed back to their source by offset.
+    Returns one issue list per input, in order.
+    """
+    results = [[] for _ in codes]
+    if not codes:
+        return results
+
+    pieces = []
+    starts = []
+    pos = 0
+    for i, code in enumerate(codes):
+        if i:
+            sep = "\n*__stata_library_sep_%d__*\n" % i
+            pieces.append(sep)
+            pos += len(sep)
+        starts.append(pos)
+        pieces.append(code or "")
+        pos += len(code or "")
+    joined = "".join(pieces)
+
+    nl = _newline_offsets(joined)
+    for m in _COMBINED.finditer(joined):
+        idx = bisect_right(starts, m.start()) - 1
+        line = bisect_left(nl, m.start()) - bisect_left(nl, starts[idx]) + 1
+        results[idx].append(Issue(m.lastgroup, line))
+
+    # Structural checks need program-block context, so they stay
+    # per source.
+    for i, code in enumerate(codes):
+        if not code:
+            continue
+        merged = heapq.merge(
+            results[i], *_structural_issue_lists(code), key=attrgetter("line")
+        )
+        results[i] = [_issue_dict(x) for x in merged]
+    return results
+
+
+@lru_cache(maxsize=512)
+def _detect_patterns_cached(code):
+    issues = []
+
+    # Line-based regex patterns, fused into one scan of the source.
+    # Line numbers come from a bisect over the newline offsets rather
+    # than rescanning the prefix for every match.
+    nl = _newline_offsets(code)
+    for m in _COMBINED.finditer(code):
+        issues.append(Issue(m.lastgroup, bisect_left(nl, m.start()) + 1))
+
+    # Every stream is already line-sorted, so an n-way merge replaces
+    # the final full sort.
+    merged = heapq.merge(
+        issues, *_structural_issue_lists(code), key=attrgetter("line")
+    )
+    return tuple(_issue_dict(x) for x in merged)
+
+
+def detect_patterns(code):
+    """Run every check against *code* and return a list of issues.
+
+    Results are memoized per source string; the issue dicts are shared
+    between calls and must be treated as read-only.
+    """
+    if not code:
+        return []
+    return list(_detect_patterns_cached(code))
+
+
+def validate_ado_code(code):
+    """Validate a chunk of ado/do code and summarize the findings."""
+    all_issues = detect_patterns(code)
+    n_errors = 0
+    n_warnings = 0
+    for issue in all_issues:
+        severity = issue["severity"]
+        if severity == "error":
+            n_errors += 1
+        elif severity == "warning":
+            n_warnings += 1
+    return {
+        "valid": n_errors == 0,
+        "n_errors": n_errors,
+        "n_warnings": n_warnings,
+        "issues": all_issues,
+    }
+
+
+# Summary projections of PATTERNS, grouped by category once at import
+# so list_patterns is a dict lookup rather than a scan.
+_PATTERN_SUMMARIES = [
+    {
+        "id": p.id,
+        "severity": p.severity,
+        "category": p.category,
+        "title": p.title,
+    }
+    for p in PATTERNS
+]
+_PATTERNS_BY_CATEGORY = {}
+for _s in _PATTERN_SUMMARIES:
+    _PATTERNS_BY_CATEGORY.setdefault(_s["category"], []).append(_s)
+del _s
+
+
+def list_patterns(category=None):
+    """List the known patterns, optionally filtered by category."""
+    if category:
+        return list(_PATTERNS_BY_CATEGORY.get(category, ()))
+    return list(_PATTERN_SUMMARIES)
+
+
+_ID2INFO = {
+    p.id: {
+        "id": p.id,
+        "severity": p.severity,
+        "category": p.category,
+        "title": p.title,
+        "description": p.description,
+    }
+    for p in PATTERNS
+}
+
+
+def get_pattern_info(pattern_id):
+    """Full record for one pattern id, or None.
+
+    Shared record; callers must treat it as read-only.
+    """
+    return _ID2INFO.get(pattern_id)
+
+
+def main(argv):
+    if not argv or argv[0] in ("-h", "--help"):
+        print(__doc__)
+        return 0
+    if argv[0] == "--version":
+        print(VALIDATOR_VERSION)
+        return 0
+    try:
+        with open(argv[0], encoding="utf-8", errors="replace") as f:
+            code = f.read()
+    except OSError as exc:
+        print(json.dumps({"error": str(exc)}))
+        return 2
+    result = validate_ado_code(code)
+    print(json.dumps(result, indent=2))
+    return 0 if result["valid"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,1094 @@
+#!/usr/bin/env python3
+"""
+cross_validate.py
+Python cross-validation harness for the tvtools interval builders.
+
+Holds independent pandas/NumPy reference implementations of the
+tvexpose, tvmerge, tvage, and tvevent interval logic, plus helpers to
+round-trip datasets through batch Stata and compare results.  The
+reference implementations are deliberately written from the documented
+behavior, not from the ado code, so agreement is meaningful.
+
+Run from this qa/ directory with a working `stata-mp` on PATH:
+
+    python cross_validate.py
+
+Emits one final line in the suite result contract:
+
+    RESULT: cross_validate tests=N pass=N fail=N
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+QA_DIR = os.path.dirname(os.path.abspath(__file__))
+STATA = os.environ.get("TVTOOLS_STATA", "stata-mp")
+
+_NUM_TYPES = (int, float, np.integer, np.floating)
+
+# polars sorts large multi-key frames much faster than pandas; the
+# reference builders use it for their final sort when it is installed.
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+
+def _sorted_frame(data, by):
+    """Frame from column arrays, sorted by *by* (stable).
+
+    Goes through polars when available -- its multithreaded sort
+    dominates the build time of the larger reference outputs -- and
+    falls back to a pandas stable sort otherwise.
+    """
+    arrays = {k: np.asarray(v) for k, v in data.items()}
+    if pl is not None and all(a.dtype != object for a in arrays.values()):
+        sorted_pl = pl.from_dict(arrays).sort(by, maintain_order=True)
+        return pd.DataFrame({c: sorted_pl[c].to_numpy() for c in sorted_pl.columns})
+    return (
+        pd.DataFrame(data)
+        .sort_values(by, kind="stable")
+        .reset_index(drop=True)
+    )
+
+# Optional Numba kernel for the numeric column comparison: a compiled
+# early-exit scan beats building the full np.isclose mask when columns
+# agree, which is the common case.  Falls back to pure NumPy.  The
+# numba import itself costs more than a second, so it is resolved on
+# the first dataframe check instead of at module import.
+_MISMATCH_KERNEL = None
+_NUMBA_CHECKED = False
+
+
+def _mismatch_kernel():
+    global _MISMATCH_KERNEL, _NUMBA_CHECKED
+    if not _NUMBA_CHECKED:
+        _NUMBA_CHECKED = True
+        try:
+            from numba import njit
+        except ImportError:
+            pass
+        else:
+            @njit(cache=True)
+            def _first_mismatch(a, b, tol):
+                for i in range(a.shape[0]):
+                    ai = a[i]
+                    bi = b[i]
+                    a_nan = np.isnan(ai)
+                    b_nan = np.isnan(bi)
+                    if a_nan and b_nan:
+                        continue
+                    if a_nan != b_nan or abs(ai - bi) > tol:
+                        return i
+                return -1
+
+            _MISMATCH_KERNEL = _first_mismatch
+    return _MISMATCH_KERNEL
+
+
+# =========================================================================
+# Result tracking
+# =========================================================================
+
+class TestTracker:
+    """Counts pass/fail checks and prints the QA result line."""
+
+    def __init__(self, suite="cross_validate"):
+        self.suite = suite
+        self.passed = 0
+        self.failed = 0
+        self.failures = []
+
+    def check(self, name, actual, expected, tolerance=1e-9):
+        """Record one comparison; numerics compare within *tolerance*."""
+        # Exact-type probes catch the overwhelmingly common plain
+        # int/float case without walking the MRO twice per call.
+        t_act = type(actual)
+        t_exp = type(expected)
+        if (t_act is int or t_act is float) and (
+            t_exp is int or t_exp is float
+        ):
+            ok = abs(actual - expected) <= tolerance
+        elif isinstance(actual, _NUM_TYPES) and isinstance(
+            expected, _NUM_TYPES
+        ):
+            ok = abs(float(actual) - float(expected)) <= tolerance
+        else:
+            ok = actual == expected
+        if ok:
+            self.passed += 1
+        else:
+            self.failed += 1
+            self.failures.append(
+                f"{name}: expected {expected!r}, got {actual!r}"
+            )
+        return ok
+
+    def check_numeric(self, name, actual, expected, tolerance=1e-9):
+        """check() without type dispatch, for known-numeric callers."""
+        if abs(actual - expected) <= tolerance:
+            self.passed += 1
+            return True
+        self.failed += 1
+        self.failures.append(f"{name}: expected {expected!r}, got {actual!r}")
+        return False
+
+    def check_dataframes(self, name, actual, expected, tolerance=1e-9):
+        """Compare *actual* against *expected* column by column.
+
+        Numeric columns compare as whole NumPy arrays with np.isclose
+        (NaN equal to NaN); other columns compare elementwise after a
+        sentinel fill, so the per-cell work stays in C.
+        """
+        if actual.shape[0] != expected.shape[0]:
+            self.failed += 1
+            self.failures.append(
+                f"{name}: row count {actual.shape[0]} != {expected.shape[0]}"
+            )
+            return False
+        # Fast path: when every column matches, one C-level frame
+        # comparison settles the whole check.  Only on disagreement do
+        # we fall through to the per-column pass to localize it.
+        cols = list(expected.columns)
+        if all(c in actual.columns for c in cols):
+            try:
+                pd.testing.assert_frame_equal(
+                    actual[cols].reset_index(drop=True),
+                    expected.reset_index(drop=True),
+                    atol=tolerance,
+                    check_dtype=False,
+                    check_names=False,
+                )
+            except AssertionError:
+                pass
+            else:
+                self.passed += len(cols)
+                return True
+        ok = True
+        for col in expected.columns:
+            if col not in actual.columns:
+                self.failed += 1
+                self.failures.append(f"{name}[{col}]: column missing")
+                ok = False
+                continue
+            exp_col = expected[col]
+            act_col = actual[col]
+            if is_numeric_dtype(exp_col) and is_numeric_dtype(act_col):
+                act_arr = act_col.to_numpy(dtype=float)
+                exp_arr = exp_col.to_numpy(dtype=float)
+                kernel = _mismatch_kernel()
+                if kernel is not None and kernel(act_arr, exp_arr, tolerance) < 0:
+                    self.passed += 1
+                    continue
+                mask = np.isclose(
+                    act_arr, exp_arr, atol=tolerance, equal_nan=True
+                )
+            else:
+                sentinel = "__tvtools_missing__"
+                mask = (
+                    act_col.fillna(sentinel).to_numpy()
+                    == exp_col.fillna(sentinel).to_numpy()
+                )
+            if mask.all():
+                self.passed += 1
+            else:
+                bad = np.flatnonzero(~mask)[:5]
+                self.failed += 1
+                self.failures.append(
+                    f"{name}[{col}]: {int((~mask).sum())} mismatches, "
+                    f"first rows {bad.tolist()}"
+                )
+                ok = False
+        return ok
+
+    def summary(self):
+        for failure in self.failures:
+            print(f"  FAIL {failure}")
+        total = self.passed + self.failed
+        print(
+            f"RESULT: {self.suite} tests={total} "
+            f"pass={self.passed} fail={self.failed}"
+        )
+        return self.failed == 0
+
+
+# =========================================================================
+# Stata round-trip helpers
+# =========================================================================
+
+def save_dta(df, path):
+    """Write *df* as a Stata .dta, downcasting int64 to Stata long.
+
+    One astype call with a dtype map does every conversion at once and
+    already returns a new frame, so no defensive full-frame copy is
+    needed.
+    """
+    int64_cols = df.select_dtypes(include=["int64"]).columns
+    df_out = (
+        df.astype({c: np.int32 for c in int64_cols}) if len(int64_cols) else df
+    )
+    df_out.to_stata(str(path), write_index=False)
+
+
+def load_dta(path):
+    """Read a Stata .dta produced by the do-file side."""
+    return pd.read_stata(str(path))
+
+
+# Scratch directory for do-files and logs, created once per process so
+# repeated run_stata calls do not churn directory inodes.
+_RUN_DIR = None
+
+
+def _run_dir():
+    global _RUN_DIR
+    if _RUN_DIR is None:
+        _RUN_DIR = tempfile.mkdtemp(prefix="tvtools_stata_")
+    return _RUN_DIR
+
+
+def run_stata(do_code, cwd=None):
+    """Run *do_code* through batch Stata and return the log text."""
+    cwd = cwd or _run_dir()
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".do", dir=cwd, delete=False
+    ) as handle:
+        handle.write(do_code)
+        do_file = handle.name
+    log_file = os.path.join(
+        cwd, os.path.splitext(os.path.basename(do_file))[0] + ".log"
+    )
+    try:
+        subprocess.run(
+            [STATA, "-b", "do", do_file],
+            cwd=cwd,
+            check=True,
+            timeout=600,
+            capture_output=True,
+        )
+        with open(log_file, encoding="utf-8", errors="replace") as handle:
+            return handle.read()
+    finally:
+        # Unlink directly instead of stat-then-unlink: one syscall per
+        # file and no race against a concurrent cleanup.
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(do_file)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(log_file)
+
+
+# =========================================================================
+# Reference implementations
+# =========================================================================
+
+def python_tvexpose(cohort, exposures, reference=0, exposed=1):
+    """Reference tvexpose: split follow-up into exposure periods.
+
+    Exposure episodes are clipped to the study window; reference
+    periods cover the baseline before the first episode, the gaps
+    between episodes, and the tail after the last one.  Episodes are
+    assumed non-overlapping, as tvexpose requires.
+
+    Fully vectorized: one merge attaches the study window, one sort
+    orders episodes within person, and the baseline/gap/tail reference
+    rows fall out of shifted column arithmetic, with no per-person
+    loop.
+    """
+    exp = exposures.merge(
+        cohort[["id", "study_entry", "study_exit"]], on="id"
+    )
+    exp = exp[
+        (exp["exp_stop"] >= exp["study_entry"])
+        & (exp["exp_start"] <= exp["study_exit"])
+    ]
+    exp = exp.sort_values(["id", "exp_start"], kind="stable")
+
+    ids = exp["id"].to_numpy()
+    entry = exp["study_entry"].to_numpy(dtype=np.int64)
+    exit_d = exp["study_exit"].to_numpy(dtype=np.int64)
+    start = np.maximum(exp["exp_start"].to_numpy(dtype=np.int64), entry)
+    stop = np.minimum(exp["exp_stop"].to_numpy(dtype=np.int64), exit_d)
+
+    if len(ids):
+        new_id = ids[1:] != ids[:-1]
+        first_of_id = np.concatenate(([True], new_id))
+        last_of_id = np.concatenate((new_id, [True]))
+        prev_stop = np.concatenate(([0], stop[:-1]))
+    else:
+        first_of_id = last_of_id = np.zeros(0, dtype=bool)
+        prev_stop = np.zeros(0, dtype=np.int64)
+
+    baseline = first_of_id & (entry < start)
+    gap = ~first_of_id & (start - prev_stop > 1)
+    tail = last_of_id & (stop < exit_d)
+
+    # Persons with no in-window episode get one reference period.
+    unexposed = ~cohort["id"].isin(pd.unique(ids)).to_numpy()
+    coh_ids = cohort["id"].to_numpy()[unexposed]
+    coh_entry = cohort["study_entry"].to_numpy(dtype=np.int64)[unexposed]
+    coh_exit = cohort["study_exit"].to_numpy(dtype=np.int64)[unexposed]
+
+    out_id = np.concatenate(
+        (ids, ids[baseline], ids[gap], ids[tail], coh_ids)
+    )
+    out_start = np.concatenate(
+        (
+            start,
+            entry[baseline],
+            prev_stop[gap] + 1,
+            stop[tail] + 1,
+            coh_entry,
+        )
+    )
+    out_stop = np.concatenate(
+        (
+            stop,
+            start[baseline] - 1,
+            start[gap] - 1,
+            exit_d[tail],
+            coh_exit,
+        )
+    )
+    # Exposure categories are tiny codes (reference/exposed/former);
+    # int8 keeps the value column an eighth the size of the date
+    # columns, which matters on million-row expansions.
+    out_value = np.concatenate(
+        (
+            np.full(len(ids), exposed, dtype=np.int8),
+            np.full(
+                int(baseline.sum() + gap.sum() + tail.sum()) + len(coh_ids),
+                reference,
+                dtype=np.int8,
+            ),
+        )
+    )
+    return _sorted_frame(
+        {
+            "id": out_id,
+            "exp_start": out_start,
+            "exp_stop": out_stop,
+            "exp_value": out_value,
+        },
+        ["id", "exp_start"],
+    )
+
+
+# Compiled ever-treated kernel, resolved lazily like the mismatch and
+# tvage kernels.  It walks the sorted tvexpose arrays once, writing
+# into preallocated outputs (at most two rows per person) and returns
+# the row count.
+_EVERTREATED_KERNEL = None
+_EVERTREATED_CHECKED = False
+
+
+def _evertreated_kernel():
+    global _EVERTREATED_KERNEL, _EVERTREATED_CHECKED
+    if not _EVERTREATED_CHECKED:
+        _EVERTREATED_CHECKED = True
+        try:
+            from numba import njit
+        except ImportError:
+            pass
+        else:
+            @njit(cache=True)
+            def _fill(ids, starts, stops, vals, reference, exposed,
+                      out_id, out_start, out_stop, out_value):
+                n = ids.shape[0]
+                k = 0
+                i = 0
+                while i < n:
+                    pid = ids[i]
+                    j = i
+                    found = False
+                    first_exp = 0
+                    while j < n and ids[j] == pid:
+                        if not found and vals[j] != reference:
+                            found = True
+                            first_exp = starts[j]
+                        j += 1
+                    start = starts[i]
+                    stop = stops[j - 1]
+                    if not found:
+                        out_id[k] = pid
+                        out_start[k] = start
+                        out_stop[k] = stop
+                        out_value[k] = reference
+                        k += 1
+                    else:
+                        if start < first_exp:
+                            out_id[k] = pid
+                            out_start[k] = start
+                            out_stop[k] = first_exp - 1
+                            out_value[k] = reference
+                            k += 1
+                        out_id[k] = pid
+                        out_start[k] = first_exp
+                        out_stop[k] = stop
+                        out_value[k] = exposed
+                        k += 1
+                    i = j
+                return k
+
+            _EVERTREATED_KERNEL = _fill
+    return _EVERTREATED_KERNEL
+
+
+def python_tvexpose_evertreated(cohort, exposures, reference=0, exposed=1):
+    """Ever-treated transform: one switch from reference to exposed.
+
+    Runs as a compiled single-pass kernel over the sorted tvexpose
+    arrays when numba is available; otherwise falls back to the
+    slice-indexed Python loop.
+    """
+    tv = python_tvexpose(cohort, exposures, reference=reference, exposed=exposed)
+    ids = tv["id"].to_numpy()
+    starts = tv["exp_start"].to_numpy()
+    stops = tv["exp_stop"].to_numpy()
+    vals = tv["exp_value"].to_numpy()
+
+    kernel = _evertreated_kernel()
+    if kernel is not None and len(ids) and ids.dtype.kind in "iu":
+        n_persons = int((ids[1:] != ids[:-1]).sum()) + 1
+        out_id = np.empty(2 * n_persons, dtype=np.int64)
+        out_start = np.empty(2 * n_persons, dtype=np.int64)
+        out_stop = np.empty(2 * n_persons, dtype=np.int64)
+        out_value = np.empty(2 * n_persons, dtype=np.int8)
+        k = kernel(
+            ids.astype(np.int64, copy=False),
+            starts.astype(np.int64, copy=False),
+            stops.astype(np.int64, copy=False),
+            vals.astype(np.int64, copy=False),
+            reference,
+            exposed,
+            out_id,
+            out_start,
+            out_stop,
+            out_value,
+        )
+        # The kernel emits persons in input order with at most one
+        # baseline row before the exposed row, so the output is
+        # already sorted by id and start.
+        return pd.DataFrame(
+            {
+                "id": out_id[:k],
+                "exp_start": out_start[:k],
+                "exp_stop": out_stop[:k],
+                "exp_value": out_value[:k],
+            }
+        )
+    # tvexpose output is sorted by id, so each person is a contiguous
+    # row slice; np.unique gives the slice bounds and the per-person
+    # work indexes arrays instead of filtering the frame with boolean
+    # masks (which rescan every row for every person).
+    uniq_ids, first_row = np.unique(ids, return_index=True)
+    bounds = np.append(first_row, len(ids))
+    out_id = []
+    out_start = []
+    out_stop = []
+    out_value = []
+    for k, pid in enumerate(uniq_ids):
+        lo, hi = bounds[k], bounds[k + 1]
+        exp_idx = np.flatnonzero(vals[lo:hi] != reference)
+        start = int(starts[lo])
+        stop = int(stops[hi - 1])
+        if len(exp_idx) == 0:
+            out_id.append(pid)
+            out_start.append(start)
+            out_stop.append(stop)
+            out_value.append(reference)
+            continue
+        first_exp = int(starts[lo + exp_idx[0]])
+        if start < first_exp:
+            out_id.append(pid)
+            out_start.append(start)
+            out_stop.append(first_exp - 1)
+            out_value.append(reference)
+        out_id.append(pid)
+        out_start.append(first_exp)
+        out_stop.append(stop)
+        out_value.append(exposed)
+    n = len(out_id)
+    return _sorted_frame(
+        {
+            "id": np.asarray(out_id),
+            "exp_start": np.fromiter(out_start, np.int64, n),
+            "exp_stop": np.fromiter(out_stop, np.int64, n),
+            "exp_value": np.fromiter(out_value, np.int8, n),
+        },
+        ["id", "exp_start"],
+    )
+
+
+def python_tvexpose_currentformer(
+    cohort, exposures, reference=0, current=1, former=2
+):
+    """Current/former transform: reference time after an exposure
+    becomes former rather than returning to reference.
+
+    The former-marking is a per-person cummax over the current flag,
+    and collapsing abutting same-value periods is run-length encoding:
+    run boundaries come from shifted-column comparisons, and each run
+    contributes its first start and last stop.  No per-person loop.
+    """
+    tv = python_tvexpose(cohort, exposures, reference=reference, exposed=current)
+    if len(tv) == 0:
+        return tv
+    ids = tv["id"].to_numpy()
+    starts = tv["exp_start"].to_numpy()
+    stops = tv["exp_stop"].to_numpy()
+    vals = tv["exp_value"].to_numpy().copy()
+
+    is_current = vals == current
+    seen = (
+        pd.Series(is_current).groupby(pd.Series(ids), sort=False)
+        .cummax()
+        .to_numpy()
+    )
+    vals[~is_current & seen] = former
+
+    new_run = np.concatenate(
+        (
+            [True],
+            (ids[1:] != ids[:-1])
+            | (vals[1:] != vals[:-1])
+            | (starts[1:] != stops[:-1] + 1),
+        )
+    )
+    run_first = np.flatnonzero(new_run)
+    run_last = np.concatenate((run_first[1:] - 1, [len(ids) - 1]))
+    return pd.DataFrame(
+        {
+            "id": ids[run_first],
+            "exp_start": starts[run_first],
+            "exp_stop": stops[run_last],
+            "exp_value": vals[run_first],
+        }
+    )
+
+
+# NCLS does the interval-overlap join in C; without it the reference
+# falls back to the per-id pairwise scan.
+try:
+    from ncls import NCLS
+except ImportError:
+    NCLS = None
+
+
+def python_tvmerge_intersect(
+    ds1, ds2, start1="start1", stop1="stop1", start2="start2", stop2="stop2"
+):
+    """Reference tvmerge intersect: overlap spans of two interval sets.
+
+    Carries every non-interval column from both sides onto the
+    intersected rows, as tvmerge does.  With ncls installed the overlap
+    pairs come from one Nested Containment List query: each id gets a
+    disjoint coordinate band, so a single global NCLS answers every
+    person at once and no Python-level pairing remains.
+    """
+    carry1 = [c for c in ds1.columns if c not in ("id", start1, stop1)]
+    carry2 = [c for c in ds2.columns if c not in ("id", start2, stop2)]
+
+    if NCLS is not None and len(ds1) and len(ds2):
+        id1 = ds1["id"].to_numpy()
+        id2 = ds2["id"].to_numpy()
+        codes = pd.factorize(np.concatenate((id1, id2)))[0].astype(np.int64)
+        codes1 = codes[: len(id1)]
+        codes2 = codes[len(id1):]
+        s1 = ds1[start1].to_numpy(dtype=np.int64)
+        e1 = ds1[stop1].to_numpy(dtype=np.int64)
+        s2 = ds2[start2].to_numpy(dtype=np.int64)
+        e2 = ds2[stop2].to_numpy(dtype=np.int64)
+
+        # Shift into non-negative coordinates and band by id so
+        # intervals of different persons can never overlap.
+        shift = min(s1.min(), s2.min())
+        band = max(e1.max(), e2.max()) - shift + 2
+        tree = NCLS(
+            codes2 * band + (s2 - shift),
+            codes2 * band + (e2 - shift) + 1,
+            np.arange(len(s2), dtype=np.int64),
+        )
+        left, right = tree.all_overlaps_both(
+            codes1 * band + (s1 - shift),
+            codes1 * band + (e1 - shift) + 1,
+            np.arange(len(s1), dtype=np.int64),
+        )
+        result = {
+            "id": id1[left],
+            "start": np.maximum(s1[left], s2[right]),
+            "stop": np.minimum(e1[left], e2[right]),
+        }
+        for col in carry1:
+            result[col] = ds1[col].to_numpy()[left]
+        for col in carry2:
+            result[col] = ds2[col].to_numpy()[right]
+        return _sorted_frame(result, ["id", "start"])
+
+    # Same contiguous-slice indexing as evertreated: sort each side by
+    # id once and pair person slices, rather than masking both frames
+    # for every id.
+    ds1 = ds1.sort_values("id", kind="stable")
+    ds2 = ds2.sort_values("id", kind="stable")
+    ids2 = ds2["id"].to_numpy()
+    uniq2, first2 = np.unique(ids2, return_index=True)
+    bounds2 = dict(
+        zip(uniq2.tolist(), zip(first2.tolist(), np.append(first2[1:], len(ids2)).tolist()))
+    )
+    ids1 = ds1["id"].to_numpy()
+    uniq1, first1 = np.unique(ids1, return_index=True)
+    bounds1 = np.append(first1, len(ids1))
+    # Row access goes through plain arrays pulled out once per frame;
+    # iterrows would box every row into a Series.
+    a_s1 = ds1[start1].to_numpy()
+    a_e1 = ds1[stop1].to_numpy()
+    a_s2 = ds2[start2].to_numpy()
+    a_e2 = ds2[stop2].to_numpy()
+    carry1_arrays = [(col, ds1[col].to_numpy()) for col in carry1]
+    carry2_arrays = [(col, ds2[col].to_numpy()) for col in carry2]
+    results = []
+    for k, pid in enumerate(uniq1):
+        if pid not in bounds2:
+            continue
+        lo2, hi2 = bounds2[pid]
+        for i1 in range(bounds1[k], bounds1[k + 1]):
+            for i2 in range(lo2, hi2):
+                int_start = max(a_s1[i1], a_s2[i2])
+                int_stop = min(a_e1[i1], a_e2[i2])
+                if int_start <= int_stop:
+                    row = {
+                        "id": pid,
+                        "start": int(int_start),
+                        "stop": int(int_stop),
+                    }
+                    for col, arr in carry1_arrays:
+                        row[col] = arr[i1]
+                    for col, arr in carry2_arrays:
+                        row[col] = arr[i2]
+                    results.append(row)
+    if not results:
+        return pd.DataFrame(columns=["id", "start", "stop", *carry1, *carry2])
+    return (
+        pd.DataFrame(results)
+        .sort_values(["id", "start"])
+        .reset_index(drop=True)
+    )
+
+
+# Compiled birthday-splitting kernel, resolved lazily like the
+# mismatch kernel.  Rounding matches Python's round-half-to-even so the
+# kernel and the fallback agree on exact half-day boundaries.
+_TVAGE_KERNEL = None
+_TVAGE_CHECKED = False
+
+
+def _tvage_kernel():
+    global _TVAGE_KERNEL, _TVAGE_CHECKED
+    if not _TVAGE_CHECKED:
+        _TVAGE_CHECKED = True
+        try:
+            from numba import njit, prange
+        except ImportError:
+            pass
+        else:
+            import math
+
+            # Persons are independent, so the outer loop is a prange:
+            # each person writes into its own output band starting at
+            # offsets[i] and reports how many rows it used in counts[i];
+            # the caller compacts the bands afterwards.
+            @njit(cache=True, parallel=True)
+            def _fill(pid, dob, entry, exit_d, groupwidth, offsets,
+                      out_id, out_age, out_start, out_stop, counts):
+                for i in prange(pid.shape[0]):
+                    k = offsets[i]
+                    age_entry = int(math.floor((entry[i] - dob[i]) / 365.25))
+                    age_exit = int(math.floor((exit_d[i] - dob[i]) / 365.25))
+                    for age in range(age_entry, age_exit + 1):
+                        x = dob[i] + age * 365.25
+                        ps = int(math.floor(x + 0.5))
+                        if x % 1.0 == 0.5 and ps % 2 == 1:
+                            ps -= 1
+                        y = dob[i] + (age + 1) * 365.25
+                        pe = int(math.floor(y + 0.5))
+                        if y % 1.0 == 0.5 and pe % 2 == 1:
+                            pe -= 1
+                        pe -= 1
+                        start = ps if ps > entry[i] else entry[i]
+                        stop = pe if pe < exit_d[i] else exit_d[i]
+                        if start > stop:
+                            continue
+                        out_id[k] = pid[i]
+                        out_age[k] = (age // groupwidth) * groupwidth
+                        out_start[k] = start
+                        out_stop[k] = stop
+                        k += 1
+                    counts[i] = k - offsets[i]
+
+            _TVAGE_KERNEL = _fill
+    return _TVAGE_KERNEL
+
+
+def python_tvage(cohort, groupwidth=1):
+    """Reference tvage: split follow-up at birthdays into age periods.
+
+    With numba available the per-birthday loop runs as a compiled
+    kernel over SoA arrays into preallocated output columns.
+    """
+    kernel = _tvage_kernel()
+    if kernel is not None:
+        pid = cohort["id"].to_numpy(dtype=np.int64)
+        dob = cohort["dob"].to_numpy(dtype=np.float64)
+        entry = cohort["study_entry"].to_numpy(dtype=np.int64)
+        exit_d = cohort["study_exit"].to_numpy(dtype=np.int64)
+        # Upper bound on output rows: one per person-year of age span.
+        # The cumsum gives each person a private output band, so the
+        # kernel can run persons in parallel.
+        ages_entry = np.floor((entry - dob) / 365.25).astype(np.int64)
+        ages_exit = np.floor((exit_d - dob) / 365.25).astype(np.int64)
+        spans = ages_exit - ages_entry + 1
+        offsets = (np.cumsum(spans) - spans).astype(np.int64)
+        n_max = int(spans.sum()) if len(pid) else 0
+        out_id = np.empty(n_max, dtype=np.int64)
+        out_age = np.empty(n_max, dtype=np.int64)
+        out_start = np.empty(n_max, dtype=np.int64)
+        out_stop = np.empty(n_max, dtype=np.int64)
+        counts = np.zeros(len(pid), dtype=np.int64)
+        kernel(
+            pid, dob, entry, exit_d, groupwidth, offsets,
+            out_id, out_age, out_start, out_stop, counts,
+        )
+        # Compact the bands: ragged arange of the used slots.
+        total = int(counts.sum())
+        used = (
+            np.repeat(offsets, counts)
+            + np.arange(total)
+            - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        df = pd.DataFrame(
+            {
+                "id": out_id[used],
+                "age": out_age[used],
+                "age_start": out_start[used],
+                "age_stop": out_stop[used],
+            }
+        )
+        if groupwidth > 1:
+            df = df.groupby(["id", "age"], as_index=False).agg(
+                age_start=("age_start", "min"), age_stop=("age_stop", "max")
+            )
+        return df.sort_values(["id", "age_start"]).reset_index(drop=True)
+
+    # Pure-NumPy fallback: a ragged arange expands one row per
+    # person-year, np.round (half-to-even, same as the kernel and
+    # builtin round) lands the birthdays, and a validity mask drops
+    # the clipped-away edge periods.
+    pid = cohort["id"].to_numpy()
+    dob = cohort["dob"].to_numpy(dtype=np.float64)
+    entry = cohort["study_entry"].to_numpy(dtype=np.int64)
+    exit_d = cohort["study_exit"].to_numpy(dtype=np.int64)
+    ages_entry = np.floor((entry - dob) / 365.25).astype(np.int64)
+    ages_exit = np.floor((exit_d - dob) / 365.25).astype(np.int64)
+    spans = ages_exit - ages_entry + 1
+    total = int(spans.sum()) if len(pid) else 0
+    rep = np.repeat(np.arange(len(pid)), spans)
+    ages = (
+        ages_entry[rep]
+        + np.arange(total)
+        - np.repeat(np.cumsum(spans) - spans, spans)
+    )
+    period_start = np.round(dob[rep] + ages * 365.25).astype(np.int64)
+    period_stop = np.round(dob[rep] + (ages + 1) * 365.25).astype(np.int64) - 1
+    starts = np.maximum(period_start, entry[rep])
+    stops = np.minimum(period_stop, exit_d[rep])
+    valid = starts <= stops
+    df = pd.DataFrame(
+        {
+            "id": pid[rep][valid],
+            "age": (ages[valid] // groupwidth) * groupwidth,
+            "age_start": starts[valid],
+            "age_stop": stops[valid],
+        }
+    )
+    if groupwidth > 1:
+        df = df.groupby(["id", "age"], as_index=False).agg(
+            age_start=("age_start", "min"), age_stop=("age_stop", "max")
+        )
+    return df.sort_values(["id", "age_start"]).reset_index(drop=True)
+
+
+def python_tvevent_split(
+    intervals, events, start_col="exp_start", stop_col="exp_stop",
+    date_col="event_date"
+):
+    """Reference tvevent: split intervals at each person's first event.
+
+    The interval containing the event is cut so its first part ends on
+    the event day with _event set; later time carries _event 0.
+    """
+    first = events.drop_duplicates("id")
+    event_of = intervals["id"].map(
+        pd.Series(first[date_col].to_numpy(), index=first["id"])
+    ).to_numpy(dtype=float)
+
+    starts = intervals[start_col].to_numpy()
+    stops = intervals[stop_col].to_numpy()
+    has_event = ~np.isnan(event_of)
+    inside = has_event & (event_of >= starts) & (event_of < stops)
+    at_stop = has_event & (event_of == stops)
+
+    # Each interval maps to one output row, or two where the event
+    # falls strictly inside it; np.repeat expands the row indices and
+    # boolean assignment patches the split halves in place.
+    idx = np.repeat(np.arange(len(intervals)), np.where(inside, 2, 1))
+    out = intervals.iloc[idx].reset_index(drop=True)
+    is_first = (
+        np.concatenate(([True], idx[1:] != idx[:-1]))
+        if len(idx)
+        else idx.astype(bool)
+    )
+    ins = inside[idx]
+    ev = event_of[idx]
+    out_start = starts[idx].copy()
+    out_stop = stops[idx].copy()
+    out_stop[ins & is_first] = ev[ins & is_first].astype(out_stop.dtype)
+    out_start[ins & ~is_first] = ev[ins & ~is_first].astype(out_start.dtype) + 1
+    out[start_col] = out_start
+    out[stop_col] = out_stop
+    out["_event"] = ((ins & is_first) | at_stop[idx]).astype(np.int8)
+    return out.sort_values(["id", start_col]).reset_index(drop=True)
+
+
+# Compiled column-wise mean/variance, resolved lazily like the other
+# kernels.  np.mean plus np.var reads every column twice; the kernel
+# accumulates sum and sum of squares in one pass per column.
+_MEANVAR_KERNEL = None
+_MEANVAR_CHECKED = False
+
+
+def _meanvar_kernel():
+    global _MEANVAR_KERNEL, _MEANVAR_CHECKED
+    if not _MEANVAR_CHECKED:
+        _MEANVAR_CHECKED = True
+        try:
+            from numba import njit
+        except ImportError:
+            pass
+        else:
+            @njit(cache=True)
+            def _col_mean_var(x):
+                n, m = x.shape
+                means = np.empty(m)
+                variances = np.empty(m)
+                for j in range(m):
+                    s = 0.0
+                    s2 = 0.0
+                    for i in range(n):
+                        v = x[i, j]
+                        s += v
+                        s2 += v * v
+                    means[j] = s / n
+                    variances[j] = (
+                        (s2 - s * s / n) / (n - 1) if n > 1 else np.nan
+                    )
+                return means, variances
+
+            _MEANVAR_KERNEL = _col_mean_var
+    return _MEANVAR_KERNEL
+
+
+def _col_mean_var(x):
+    kernel = _meanvar_kernel()
+    if kernel is not None and x.size:
+        return kernel(np.ascontiguousarray(x))
+    return np.mean(x, axis=0), np.var(x, axis=0, ddof=1)
+
+
+def python_smd_batch(ref_matrix, exp_matrix):
+    """Standardized mean differences, one per column of two 2-D arrays.
+
+    A single pass over all covariates: column means and sample
+    variances come from the fused kernel (or axis-0 reductions without
+    numba), so checking a whole covariate table costs a few array
+    operations rather than one python_smd call per column.
+    """
+    ref = np.atleast_2d(np.asarray(ref_matrix, dtype=float))
+    exp = np.atleast_2d(np.asarray(exp_matrix, dtype=float))
+    mean_ref, var_ref = _col_mean_var(ref)
+    mean_exp, var_exp = _col_mean_var(exp)
+    pooled = np.sqrt((var_ref + var_exp) / 2.0)
+    diff = mean_exp - mean_ref
+    return np.divide(
+        diff, pooled, out=np.zeros_like(diff), where=pooled != 0
+    )
+
+
+def python_smd(ref_values, exp_values):
+    """Standardized mean difference between two samples."""
+    ref = np.asarray(ref_values, dtype=float).reshape(-1, 1)
+    exp = np.asarray(exp_values, dtype=float).reshape(-1, 1)
+    return float(python_smd_batch(ref, exp)[0])
+
+
+def python_evalue_array(rr):
+    """E-values for an array of risk ratios, elementwise."""
+    rr = np.asarray(rr, dtype=float)
+    rr = np.where(rr < 1, 1.0 / rr, rr)
+    return rr + np.sqrt(rr * (rr - 1.0))
+
+
+def python_evalue(rr):
+    """E-value for an observed risk ratio."""
+    return float(python_evalue_array(rr))
+
+
+# =========================================================================
+# Stata vs Python suites
+# =========================================================================
+
+def _tvexpose_stata(cohort, exposures, workdir):
+    """Run tvexpose in Stata on the given frames, return its output."""
+    cohort_dta = os.path.join(workdir, "cv_cohort.dta")
+    exp_dta = os.path.join(workdir, "cv_exposures.dta")
+    result_dta = os.path.join(workdir, "cv_result.dta")
+    save_dta(cohort, cohort_dta)
+    save_dta(exposures, exp_dta)
+    do_code = f"""\
+clear all
+set varabbrev off
+version 16.0
+adopath ++ "{os.path.dirname(QA_DIR)}"
+use "{cohort_dta}", clear
+tvexpose using "{exp_dta}", id(id) start(exp_start) stop(exp_stop) ///
+    exposure(exp_value) reference(0) entry(study_entry) exit(study_exit)
+sort id exp_start
+save "{result_dta}", replace
+exit, clear
+"""
+    run_stata(do_code, cwd=workdir)
+    return load_dta(result_dta)
+
+
+def test_tvexpose_basic(tracker, workdir):
+    """One person, one exposure episode inside the study window."""
+    cohort = pd.DataFrame(
+        {"id": [1], "study_entry": [0], "study_exit": [365]}
+    )
+    exposures = pd.DataFrame(
+        {"id": [1], "exp_start": [100], "exp_stop": [200], "exp_value": [1]}
+    )
+    py_result = python_tvexpose(cohort, exposures)
+    stata_result = _tvexpose_stata(cohort, exposures, workdir)
+
+    tracker.check("basic row count", len(stata_result), len(py_result))
+    # Compare all rows at once as int64 arrays; .iloc per cell costs a
+    # Series construction per access.
+    cols = ["exp_start", "exp_stop", "exp_value"]
+    n = min(len(stata_result), len(py_result))
+    st_arr = stata_result[cols].head(n).to_numpy().astype(np.int64)
+    py_arr = py_result[cols].head(n).to_numpy().astype(np.int64)
+    diff_mask = st_arr != py_arr
+    tracker.check("basic rows identical", int(diff_mask.sum()), 0)
+    for i, j in np.argwhere(diff_mask)[:5]:
+        tracker.failures.append(
+            f"basic row {i} {cols[j]}: "
+            f"stata={st_arr[i, j]} python={py_arr[i, j]}"
+        )
+
+
+def test_tvexpose_multi_person(tracker, workdir):
+    """Several people with staggered, gapped exposure histories."""
+    cohort = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            "study_entry": [0, 50, 0],
+            "study_exit": [365, 400, 200],
+        }
+    )
+    exposures = pd.DataFrame(
+        {
+            "id": [1, 1, 2],
+            "exp_start": [100, 250, 60],
+            "exp_stop": [200, 300, 350],
+            "exp_value": [1, 1, 1],
+        }
+    )
+    py_result = python_tvexpose(cohort, exposures)
+    stata_result = _tvexpose_stata(cohort, exposures, workdir)
+
+    tracker.check("multi row count", len(stata_result), len(py_result))
+    # One groupby pass per frame instead of a boolean mask per person,
+    # and each person's contiguity settles as one array comparison.
+    st_sizes = stata_result.groupby("id", sort=False).size()
+    for pid, person in py_result.groupby("id", sort=False):
+        tracker.check(
+            f"multi id {pid} rows", int(st_sizes.get(pid, 0)), len(person)
+        )
+        # Periods must tile the follow-up with no overlap.
+        starts = person["exp_start"].to_numpy()
+        stops = person["exp_stop"].to_numpy()
+        tracker.check(
+            f"multi id {pid} contiguous",
+            bool((starts[1:] - stops[:-1] == 1).all()),
+            True,
+        )
+
+
+def _person_time(df):
+    """Total covered days in an interval frame (inclusive stops)."""
+    spans = df[["exp_start", "exp_stop"]].to_numpy()
+    return int((spans[:, 1] - spans[:, 0] + 1).sum())
+
+
+def test_person_time_conservation(tracker, workdir):
+    """Total person-time in must equal total person-time out."""
+    rng = np.random.default_rng(20240601)
+    n = 5
+    cohort = pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "study_entry": np.zeros(n, dtype=int),
+            "study_exit": rng.integers(200, 400, n),
+        }
+    )
+    exposures = pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "exp_start": rng.integers(10, 100, n),
+            "exp_stop": rng.integers(100, 180, n),
+            "exp_value": np.ones(n, dtype=int),
+        }
+    )
+    py_result = python_tvexpose(cohort, exposures)
+    stata_result = _tvexpose_stata(cohort, exposures, workdir)
+
+    expected_by_id = dict(
+        zip(cohort["id"], cohort["study_exit"] - cohort["study_entry"] + 1)
+    )
+    st_groups = dict(iter(stata_result.groupby("id", sort=False)))
+    empty = stata_result.iloc[0:0]
+    for pid, person in py_result.groupby("id", sort=False):
+        expected = int(expected_by_id[pid])
+        py_time = _person_time(person)
+        st_time = _person_time(st_groups.get(pid, empty))
+        tracker.check(f"conservation id {pid} python", py_time, expected)
+        tracker.check(f"conservation id {pid} stata", st_time, expected)
+
+
+def main():
+    tracker = TestTracker()
+    with tempfile.TemporaryDirectory(prefix="tvtools_crossval_") as workdir:
+        test_tvexpose_basic(tracker, workdir)
+        test_tvexpose_multi_person(tracker, workdir)
+        test_person_time_conservation(tracker, workdir)
+    return 0 if tracker.summary() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
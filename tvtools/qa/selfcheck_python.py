@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+selfcheck_python.py
+Stata-free self-check of the cross_validate.py reference builders.
+
+cross_validate.py keeps a compiled or accelerated path and a plain
+fallback for several builders (numba kernels, the NCLS interval join,
+the polars sort).  This suite pins the claim that the pairs agree: it
+runs each builder both ways on randomized cohorts and compares frames
+exactly, and checks implementation-independent invariants (person-time
+conservation, tiling, event placement) that hold regardless of which
+path executed.  No Stata installation is required.
+
+Run from this qa/ directory:
+
+    python selfcheck_python.py
+
+Emits one final line in the suite result contract:
+
+    RESULT: selfcheck_python tests=N pass=N fail=N
+"""
+
+import contextlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+import cross_validate as cv
+
+
+@contextlib.contextmanager
+def _forced_fallback(*prefixes):
+    """Temporarily null the named lazy accelerators in cross_validate.
+
+    Each prefix names a kernel-holder pair like ``_TVAGE_KERNEL`` /
+    ``_TVAGE_CHECKED``; ``NCLS`` and ``pl`` are plain module globals.
+    """
+    saved = {}
+    for name in prefixes:
+        if name in ("NCLS", "pl"):
+            saved[name] = getattr(cv, name)
+            setattr(cv, name, None)
+        else:
+            saved[name] = (
+                getattr(cv, name + "_KERNEL"),
+                getattr(cv, name + "_CHECKED"),
+            )
+            setattr(cv, name + "_KERNEL", None)
+            setattr(cv, name + "_CHECKED", True)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if name in ("NCLS", "pl"):
+                setattr(cv, name, value)
+            else:
+                setattr(cv, name + "_KERNEL", value[0])
+                setattr(cv, name + "_CHECKED", value[1])
+
+
+def _random_cohort(rng):
+    n = int(rng.integers(1, 10))
+    cohort = pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "study_entry": rng.integers(0, 50, n),
+        }
+    )
+    cohort["study_exit"] = cohort["study_entry"] + rng.integers(10, 300, n)
+    return cohort
+
+
+def _random_exposures(rng, cohort):
+    """Non-overlapping exposure episodes per person, possibly outside
+    the study window.  tvexpose documents non-overlapping input, so
+    the conservation invariants only hold for such histories."""
+    rows = []
+    for pid, entry, exit_d in cohort.itertuples(index=False):
+        cursor = int(rng.integers(entry - 20, entry + 20))
+        for _ in range(int(rng.integers(0, 4))):
+            start = cursor + int(rng.integers(0, 40))
+            stop = start + int(rng.integers(0, 60))
+            rows.append((pid, start, stop))
+            cursor = stop + 1 + int(rng.integers(0, 30))
+    if not rows:
+        return pd.DataFrame(columns=["id", "exp_start", "exp_stop"])
+    return pd.DataFrame(rows, columns=["id", "exp_start", "exp_stop"])
+
+
+def _frames_equal(a, b):
+    return a.reset_index(drop=True).astype("int64").equals(
+        b.reset_index(drop=True).astype("int64")
+    )
+
+
+def test_tvexpose_invariants(tracker, rng):
+    """tvexpose output must conserve person-time and tile follow-up."""
+    bad_time = 0
+    bad_tiling = 0
+    for _ in range(20):
+        cohort = _random_cohort(rng)
+        tv = cv.python_tvexpose(cohort, _random_exposures(rng, cohort))
+        for pid, person in tv.groupby("id", sort=False):
+            window = cohort.loc[cohort["id"] == pid]
+            expected = int(
+                window["study_exit"].iloc[0] - window["study_entry"].iloc[0] + 1
+            )
+            if cv._person_time(person) != expected:
+                bad_time += 1
+            starts = person["exp_start"].to_numpy()
+            stops = person["exp_stop"].to_numpy()
+            if not (starts[1:] - stops[:-1] == 1).all():
+                bad_tiling += 1
+    tracker.check("tvexpose person-time conserved", bad_time, 0)
+    tracker.check("tvexpose periods tile follow-up", bad_tiling, 0)
+
+
+def test_transform_invariants(tracker, rng):
+    """Derived transforms must preserve each person's covered days."""
+    bad = 0
+    for _ in range(20):
+        cohort = _random_cohort(rng)
+        exposures = _random_exposures(rng, cohort)
+        tv = cv.python_tvexpose(cohort, exposures)
+        for transform in (
+            cv.python_tvexpose_evertreated,
+            cv.python_tvexpose_currentformer,
+        ):
+            out = transform(cohort, exposures)
+            if cv._person_time(out) != cv._person_time(tv):
+                bad += 1
+    tracker.check("transforms conserve person-time", bad, 0)
+
+
+def test_evertreated_kernel_parity(tracker, rng):
+    """Compiled ever-treated pass must match the Python slice loop."""
+    mismatches = 0
+    for _ in range(15):
+        cohort = _random_cohort(rng)
+        exposures = _random_exposures(rng, cohort)
+        fast = cv.python_tvexpose_evertreated(cohort, exposures)
+        with _forced_fallback("_EVERTREATED"):
+            slow = cv.python_tvexpose_evertreated(cohort, exposures)
+        if not _frames_equal(fast, slow):
+            mismatches += 1
+    tracker.check("evertreated kernel vs fallback", mismatches, 0)
+
+
+def test_tvage_kernel_parity(tracker, rng):
+    """Compiled birthday split must match the NumPy fallback."""
+    mismatches = 0
+    for _ in range(15):
+        n = int(rng.integers(1, 10))
+        cohort = pd.DataFrame(
+            {
+                "id": np.arange(1, n + 1),
+                "dob": rng.integers(-15000, 0, n).astype(float),
+            }
+        )
+        cohort["study_entry"] = cohort["dob"].astype(int) + rng.integers(
+            365, 20000, n
+        )
+        cohort["study_exit"] = cohort["study_entry"] + rng.integers(10, 4000, n)
+        for groupwidth in (1, 5):
+            fast = cv.python_tvage(cohort, groupwidth=groupwidth)
+            with _forced_fallback("_TVAGE"):
+                slow = cv.python_tvage(cohort, groupwidth=groupwidth)
+            if not _frames_equal(fast, slow):
+                mismatches += 1
+    tracker.check("tvage kernel vs fallback", mismatches, 0)
+
+
+def test_tvmerge_parity(tracker, rng):
+    """NCLS interval join must match the pairwise scan fallback."""
+    mismatches = 0
+    key = ["id", "start", "stop", "a", "b"]
+    for _ in range(15):
+        n1 = int(rng.integers(1, 10))
+        n2 = int(rng.integers(1, 10))
+        ds1 = pd.DataFrame(
+            {"id": rng.integers(1, 5, n1), "start1": rng.integers(0, 100, n1)}
+        )
+        ds1["stop1"] = ds1["start1"] + rng.integers(0, 50, n1)
+        ds1["a"] = rng.integers(0, 9, n1)
+        ds2 = pd.DataFrame(
+            {"id": rng.integers(1, 5, n2), "start2": rng.integers(0, 100, n2)}
+        )
+        ds2["stop2"] = ds2["start2"] + rng.integers(0, 50, n2)
+        ds2["b"] = rng.integers(0, 9, n2)
+        fast = cv.python_tvmerge_intersect(ds1, ds2)
+        with _forced_fallback("NCLS"):
+            slow = cv.python_tvmerge_intersect(ds1, ds2)
+        if not _frames_equal(
+            fast[key].sort_values(key), slow[key].sort_values(key)
+        ):
+            mismatches += 1
+    tracker.check("tvmerge NCLS vs pairwise scan", mismatches, 0)
+
+
+def test_sort_path_parity(tracker, rng):
+    """polars-sorted output must equal the pandas-sorted output."""
+    mismatches = 0
+    for _ in range(10):
+        cohort = _random_cohort(rng)
+        exposures = _random_exposures(rng, cohort)
+        fast = cv.python_tvexpose(cohort, exposures)
+        with _forced_fallback("pl"):
+            slow = cv.python_tvexpose(cohort, exposures)
+        if not _frames_equal(fast, slow):
+            mismatches += 1
+    tracker.check("polars vs pandas sort", mismatches, 0)
+
+
+def test_tvevent_split_invariants(tracker, rng):
+    """Event splitting must keep person-time and place one event."""
+    bad_time = 0
+    bad_events = 0
+    for _ in range(20):
+        cohort = _random_cohort(rng)
+        intervals = cv.python_tvexpose(cohort, _random_exposures(rng, cohort))
+        m = int(rng.integers(0, 6))
+        events = pd.DataFrame(
+            {
+                "id": rng.integers(1, len(cohort) + 1, m),
+                "event_date": rng.integers(0, 350, m),
+            }
+        )
+        out = cv.python_tvevent_split(intervals, events)
+        if cv._person_time(out) != cv._person_time(intervals):
+            bad_time += 1
+        first = events.drop_duplicates("id")
+        for pid, person in out.groupby("id", sort=False):
+            flagged = person[person["_event"] == 1]
+            ev = first.loc[first["id"] == pid, "event_date"]
+            in_window = (
+                len(ev) > 0
+                and person["exp_start"].min() <= ev.iloc[0] <= person["exp_stop"].max()
+            )
+            if in_window:
+                if len(flagged) != 1 or int(flagged["exp_stop"].iloc[0]) != int(
+                    ev.iloc[0]
+                ):
+                    bad_events += 1
+            elif len(flagged) != 0:
+                bad_events += 1
+    tracker.check("tvevent_split conserves person-time", bad_time, 0)
+    tracker.check("tvevent_split places first event", bad_events, 0)
+
+
+def test_smd_evalue_parity(tracker, rng):
+    """Batch SMD/E-value paths must match their scalar definitions."""
+    ref = rng.normal(3, 5, size=(200, 8))
+    exp = rng.normal(1, 2, size=(150, 8))
+    batch = cv.python_smd_batch(ref, exp)
+    with _forced_fallback("_MEANVAR"):
+        plain = cv.python_smd_batch(ref, exp)
+    tracker.check(
+        "smd kernel vs numpy", bool(np.allclose(batch, plain, rtol=1e-10)), True
+    )
+    worst = max(
+        abs(cv.python_smd(ref[:, j], exp[:, j]) - batch[j]) for j in range(8)
+    )
+    tracker.check_numeric("smd scalar vs batch", worst, 0.0, tolerance=1e-10)
+    rr = rng.uniform(0.05, 10, size=50)
+    worst = max(
+        abs(cv.python_evalue(r) - v)
+        for r, v in zip(rr, cv.python_evalue_array(rr))
+    )
+    tracker.check_numeric("evalue scalar vs array", worst, 0.0, tolerance=1e-12)
+    tracker.check("smd zero variance", cv.python_smd([1, 1, 1], [1, 1, 1]), 0.0)
+
+
+def main():
+    tracker = cv.TestTracker(suite="selfcheck_python")
+    rng = np.random.default_rng(20240601)
+    test_tvexpose_invariants(tracker, rng)
+    test_transform_invariants(tracker, rng)
+    test_evertreated_kernel_parity(tracker, rng)
+    test_tvage_kernel_parity(tracker, rng)
+    test_tvmerge_parity(tracker, rng)
+    test_sort_path_parity(tracker, rng)
+    test_tvevent_split_invariants(tracker, rng)
+    test_smd_evalue_parity(tracker, rng)
+    return 0 if tracker.summary() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())